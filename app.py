@@ -3,29 +3,135 @@ Flask 웹 애플리케이션
 실시간 위치 추적 및 궤적 시각화
 """
 
-import json
+import asyncio
+import logging
+import os
+import queue
 import time
 import threading
+import weakref
+from collections import deque
 from datetime import datetime
-from flask import Flask, render_template, jsonify, request
+from itertools import islice
+
+import numpy as np
+import orjson
+from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
 
 from config import ARUBA_APS, AP_POSITIONS, MAP_BOUNDS, rssi_to_distance, LOG_FILE
 from ble_scanner import ArubaBLEScanner, SimulatedScanner
-from position_estimator import PositionEstimator
+from position_estimator import PositionEstimator, warmup as warmup_estimator
+
+
+class ORJSONProvider(JSONProvider):
+    """orjson 기반 JSON 직렬화 (jsonify 가속)"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
+# 1KB 이상 응답 압축 (궤적 JSON은 키 반복이 많아 압축률이 높음)
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+Compress(app)
+
+
+
+class TrajectoryBuffer:
+    """
+    궤적 링 버퍼 (SoA)
+    x/y/timestamp를 고정 크기 NumPy 배열에 저장, 가득 차면 오래된 것부터 덮어씀
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.x = np.empty(capacity, dtype=np.float32)
+        self.y = np.empty(capacity, dtype=np.float32)
+        self.ts = np.empty(capacity, dtype=np.float64)  # epoch 초는 float32로 부족
+        self.iso = deque(maxlen=capacity)
+        self.count = 0  # 누적 추가 개수
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def append(self, point: dict):
+        """포인트 추가 ({"x", "y", "timestamp", "datetime"})"""
+        i = self.count % self.capacity
+        self.x[i] = point["x"]
+        self.y[i] = point["y"]
+        self.ts[i] = point["timestamp"]
+        self.iso.append(point["datetime"])
+        self.count += 1
+    
+    def clear(self):
+        self.count = 0
+        self.iso.clear()
+    
+    def recent(self, n: int) -> dict:
+        """최근 n개 포인트를 열(column) 단위 딕셔너리로 반환"""
+        n = min(n, len(self))
+        start = (self.count - n) % self.capacity
+        if start + n <= self.capacity:
+            # 연속 구간: 복사 없이 view
+            sel = slice(start, start + n)
+        else:
+            # 버퍼 끝을 넘어가는 경우만 인덱스 배열로 수집
+            sel = np.arange(start, start + n) % self.capacity
+        return {
+            "x": self.x[sel],
+            "y": self.y[sel],
+            "timestamp": self.ts[sel],
+            "datetime": list(islice(reversed(self.iso), n))[::-1]
+        }
+
+
 # 전역 변수
 scanner = None
 estimator = None
-trajectory = []
+TRAJECTORY_MAXLEN = 10000  # 궤적 최대 보관 개수 (오래된 것부터 제거)
+trajectory = TrajectoryBuffer(TRAJECTORY_MAXLEN)
 current_position = None
 is_tracking = False
 use_simulation = True  # 시뮬레이션 모드 기본 활성화
 
-# 백그라운드 스캔 스레드
+# 런타임에 변하지 않는 응답 (미리 직렬화)
+_APS_JSON = orjson.dumps([
+    {
+        "name": name,
+        "location": info["location"],
+        "ble_mac": info["ble_mac"],
+        "position": {"x": info["position"][0], "y": info["position"][1]},
+        "description": info["description"]
+    }
+    for name, info in ARUBA_APS.items()
+])
+_BOUNDS_JSON = orjson.dumps(MAP_BOUNDS)
+
+# 위치 로그 (NDJSON, 한 줄에 한 포인트씩 append)
+# 디스크 flush는 log_writer 스레드에서 주기적으로
+_log_fp = None
+_log_dirty = threading.Event()
+LOG_SAVE_INTERVAL = 2.0  # 초
+
+# SSE 구독자 큐 (연결이 끊기면 자동 제거)
+_subscribers = weakref.WeakSet()
+_subscribers_lock = threading.Lock()
+STREAM_KEEPALIVE = 15.0  # 초, 새 위치가 없으면 keepalive 주석 전송 (끊긴 연결 감지)
+
+# 백그라운드 스캔 (이벤트 루프 스레드)
+scan_loop = None
 scan_thread = None
 stop_scanning = False
 
@@ -34,6 +140,10 @@ def init_scanner():
     """스캐너 초기화"""
     global scanner, estimator
     
+    # 모드 전환 시 이전 스캐너 정리
+    if scanner is not None:
+        scanner.close()
+    
     if use_simulation:
         scanner = SimulatedScanner()
         print("📌 시뮬레이션 모드로 실행")
@@ -42,17 +152,18 @@ def init_scanner():
         print("📡 실제 BLE 스캔 모드로 실행")
     
     estimator = PositionEstimator(method="weighted_centroid")
+    warmup_estimator()
 
 
-def background_scan():
-    """백그라운드 스캔 루프"""
-    global current_position, trajectory, stop_scanning
+async def background_scan():
+    """백그라운드 스캔 루프 (asyncio 태스크)"""
+    global current_position
     
     while not stop_scanning:
         if is_tracking:
             try:
                 # RSSI 스캔
-                rssi_result = scanner.scan_sync(duration=1.5)
+                rssi_result = await scanner.scan_once(duration=1.5)
                 
                 # 위치 추정
                 position = estimator.estimate(rssi_result)
@@ -66,33 +177,65 @@ def background_scan():
                     }
                     
                     # 궤적에 추가
-                    trajectory.append(current_position.copy())
+                    trajectory.append(current_position)
+                    publish_position(current_position)
                     
                     # 로그 저장
-                    save_log()
+                    save_log(current_position)
                     
             except Exception as e:
                 print(f"❌ 스캔 오류: {e}")
         
-        time.sleep(0.5)
+        await asyncio.sleep(0.5)
+
+
+def start_background_scan():
+    """스캔 전용 이벤트 루프 스레드를 띄우고 background_scan 태스크 시작"""
+    global scan_loop, scan_thread, _log_fp
+    
+    _log_fp = open(LOG_FILE, 'ab', buffering=65536)
+    threading.Thread(target=log_writer, daemon=True).start()
+    
+    scan_loop = asyncio.new_event_loop()
+    scan_thread = threading.Thread(target=scan_loop.run_forever, daemon=True)
+    scan_thread.start()
+    asyncio.run_coroutine_threadsafe(background_scan(), scan_loop)
+
+
+def publish_position(position):
+    """새 위치를 SSE 구독자들에게 전달"""
+    data = orjson.dumps(position)
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait(data)
+        except queue.Full:
+            pass  # 느린 클라이언트는 건너뜀
 
 
-def save_log():
-    """위치 로그 저장"""
+def save_log(position):
+    """위치 로그에 한 줄 추가 (이전 기록은 다시 쓰지 않음)"""
     try:
-        data = {
-            "last_update": datetime.now().isoformat(),
-            "ap_count": len(ARUBA_APS),
-            "trajectory_count": len(trajectory),
-            "trajectory": trajectory[-100:]  # 최근 100개만 저장
-        }
-        
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        _log_fp.write(orjson.dumps({
+            "t": position["timestamp"],
+            "x": position["x"],
+            "y": position["y"]
+        }) + b"\n")
+        _log_dirty.set()
     except Exception as e:
         print(f"로그 저장 오류: {e}")
 
 
+def log_writer():
+    """로그 flush 스레드 (LOG_SAVE_INTERVAL 동안 쌓인 줄을 한 번에 내보냄)"""
+    while True:
+        _log_dirty.wait()
+        time.sleep(LOG_SAVE_INTERVAL)
+        _log_dirty.clear()
+        _log_fp.flush()
+
+
 @app.route('/')
 def index():
     """메인 페이지"""
@@ -113,16 +256,7 @@ def get_status():
 @app.route('/api/aps')
 def get_aps():
     """AP 정보"""
-    aps = []
-    for name, info in ARUBA_APS.items():
-        aps.append({
-            "name": name,
-            "location": info["location"],
-            "ble_mac": info["ble_mac"],
-            "position": {"x": info["position"][0], "y": info["position"][1]},
-            "description": info["description"]
-        })
-    return jsonify(aps)
+    return Response(_APS_JSON, mimetype="application/json")
 
 
 @app.route('/api/position')
@@ -142,10 +276,35 @@ def get_position():
 @app.route('/api/trajectory')
 def get_trajectory():
     """궤적 데이터"""
-    return jsonify({
+    data = orjson.dumps({
         "count": len(trajectory),
-        "trajectory": trajectory[-200:]  # 최근 200개
-    })
+        **trajectory.recent(200)  # 최근 200개 (x/y/timestamp/datetime 배열)
+    }, option=orjson.OPT_SERIALIZE_NUMPY)
+    return Response(data, mimetype="application/json")
+
+
+@app.route('/api/stream')
+def stream_position():
+    """위치 업데이트 스트림 (Server-Sent Events)"""
+    def generate():
+        q = queue.Queue(maxsize=100)
+        with _subscribers_lock:
+            _subscribers.add(q)
+        try:
+            while True:
+                try:
+                    data = q.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # 끊긴 클라이언트는 여기서 쓰기 실패 → 제너레이터 종료, 스레드 반환
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"data: " + data + b"\n\n"
+        finally:
+            with _subscribers_lock:
+                _subscribers.discard(q)
+    
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
 
 
 @app.route('/api/start', methods=['POST'])
@@ -167,8 +326,8 @@ def stop_tracking():
 @app.route('/api/clear', methods=['POST'])
 def clear_trajectory():
     """궤적 초기화"""
-    global trajectory, current_position
-    trajectory = []
+    global current_position
+    trajectory.clear()
     current_position = None
     return jsonify({"success": True, "message": "궤적 초기화됨"})
 
@@ -193,7 +352,7 @@ def set_mode():
 @app.route('/api/simulate_move', methods=['POST'])
 def simulate_move():
     """시뮬레이션 모드에서 위치 이동"""
-    global current_position, trajectory
+    global current_position
     
     if not use_simulation:
         return jsonify({"success": False, "message": "시뮬레이션 모드가 아닙니다"})
@@ -216,7 +375,8 @@ def simulate_move():
             "timestamp": time.time(),
             "datetime": datetime.now().isoformat()
         }
-        trajectory.append(current_position.copy())
+        trajectory.append(current_position)
+        publish_position(current_position)
         
         return jsonify({
             "success": True,
@@ -227,10 +387,45 @@ def simulate_move():
     return jsonify({"success": False, "message": "위치 추정 실패"})
 
 
+@app.route('/api/export')
+def export_log():
+    """위치 로그 (NDJSON) 다운로드"""
+    if _log_fp:
+        _log_fp.flush()
+    if not os.path.exists(LOG_FILE):
+        return jsonify({"success": False, "message": "로그 없음"}), 404
+    return send_file(LOG_FILE, mimetype="application/x-ndjson", as_attachment=True)
+
+
 @app.route('/api/map_bounds')
 def get_map_bounds():
     """맵 경계 정보"""
-    return jsonify(MAP_BOUNDS)
+    return Response(_BOUNDS_JSON, mimetype="application/json")
+
+
+_started = threading.Event()
+_start_lock = threading.Lock()
+
+
+def create_app():
+    """
+    스캐너 초기화 + 백그라운드 스캔 시작 후 앱 반환 (프로세스당 한 번만 실행)
+    gunicorn 진입점: gunicorn -c gunicorn_config.py
+    """
+    with _start_lock:
+        if not _started.is_set():
+            logging.basicConfig(level=logging.INFO)
+            init_scanner()
+            start_background_scan()
+            _started.set()
+    return app
+
+
+@app.before_request
+def _ensure_started():
+    """flask run 등 create_app()을 거치지 않은 경우 첫 요청에서 시작"""
+    if not _started.is_set():
+        create_app()
 
 
 if __name__ == '__main__':
@@ -238,15 +433,11 @@ if __name__ == '__main__':
     print("🚀 Aruba AP 실내 위치 추적 시스템")
     print("=" * 60)
     
-    # 스캐너 초기화
-    init_scanner()
-    
-    # 백그라운드 스캔 스레드 시작
-    scan_thread = threading.Thread(target=background_scan, daemon=True)
-    scan_thread.start()
+    create_app()
     
     print("\n📡 서버 시작: http://localhost:5000")
     print("📌 시뮬레이션 모드로 실행됩니다")
     print("   (실제 BLE 스캔은 mode API로 변경)")
+    print("   운영 환경: gunicorn -c gunicorn_config.py")
     
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
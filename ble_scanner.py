@@ -4,15 +4,21 @@ BLE 신호를 스캔하여 RSSI 값을 수집
 """
 
 import asyncio
+import logging
 import time
+import weakref
 from collections import deque
 from typing import Dict, List, Optional
+import numpy as np
 from bleak import BleakScanner
 from config import (
-    BLE_MAC_LIST, BLE_MAC_TO_AP, ARUBA_APS,
+    BLE_MAC_TO_AP, ARUBA_APS,
+    AP_NAMES_ARR, AP_POSITIONS_ARR,
     RSSI_FILTER_WINDOW, RSSI_MIN
 )
 
+log = logging.getLogger(__name__)
+
 
 class ArubaBLEScanner:
     """Aruba AP BLE 신호 스캐너"""
@@ -24,10 +30,12 @@ class ArubaBLEScanner:
         """
         self.filter_window = filter_window
         
-        # 각 AP별 RSSI 히스토리 (이동평균 계산용)
+        # 각 AP별 RSSI 히스토리 및 윈도우 합계 (이동평균 계산용)
         self.rssi_history: Dict[str, deque] = {}
+        self._rssi_sum: Dict[str, float] = {}
         for ap_name in ARUBA_APS.keys():
             self.rssi_history[ap_name] = deque(maxlen=filter_window)
+            self._rssi_sum[ap_name] = 0.0
         
         # 마지막 스캔 결과
         self.last_rssi: Dict[str, float] = {}
@@ -36,6 +44,10 @@ class ArubaBLEScanner:
         # 스캔 상태
         self.is_scanning = False
         
+        # scan_sync용 이벤트 루프 (첫 scan_sync에서 만들고 이후 재사용)
+        self._loop = None
+        self._loop_finalizer = None
+        
     async def scan_once(self, duration: float = 2.0) -> Dict[str, float]:
         """
         BLE 신호 한 번 스캔
@@ -50,26 +62,31 @@ class ArubaBLEScanner:
         result = {}
         
         try:
-            # BLE 디바이스 스캔
-            devices = await BleakScanner.discover(timeout=duration)
+            # 이번 스캔에서 감지된 AP별 마지막 RSSI
+            detected: Dict[str, float] = {}
             
-            for device in devices:
-                # MAC 주소 확인 (대문자로 정규화)
-                device_mac = device.address.upper()
+            def detection_callback(device, advertisement_data):
+                # MAC 주소 확인 - Aruba AP가 아니면 바로 무시
+                ap_name = BLE_MAC_TO_AP.get(device.address.upper())
+                if ap_name is None:
+                    return
                 
-                # Aruba AP의 BLE MAC인지 확인
-                if device_mac in BLE_MAC_LIST:
-                    ap_name = BLE_MAC_TO_AP[device_mac]
-                    rssi = device.rssi
-                    
-                    # RSSI 히스토리에 추가
-                    self.rssi_history[ap_name].append(rssi)
-                    
-                    # 이동평균 계산
-                    filtered_rssi = sum(self.rssi_history[ap_name]) / len(self.rssi_history[ap_name])
-                    result[ap_name] = filtered_rssi
-                    
-                    print(f"  📡 {ap_name}: {rssi} dBm (필터링: {filtered_rssi:.1f} dBm)")
+                rssi = advertisement_data.rssi
+                
+                # RSSI 히스토리에 추가 (광고 패킷마다)
+                self._push_rssi(ap_name, rssi)
+                detected[ap_name] = rssi
+            
+            # BLE 광고 수신 (콜백 방식)
+            async with BleakScanner(detection_callback=detection_callback):
+                await asyncio.sleep(duration)
+            
+            for ap_name, rssi in detected.items():
+                # 이동평균 계산
+                filtered_rssi = self._rssi_sum[ap_name] / len(self.rssi_history[ap_name])
+                result[ap_name] = filtered_rssi
+                
+                log.debug("%s: %s dBm (필터링: %.1f dBm)", ap_name, rssi, filtered_rssi)
             
             # 스캔되지 않은 AP는 RSSI_MIN으로 설정
             for ap_name in ARUBA_APS.keys():
@@ -89,6 +106,14 @@ class ArubaBLEScanner:
         
         return result
     
+    def _push_rssi(self, ap_name: str, rssi: float):
+        """히스토리에 RSSI 추가 + 윈도우 합계 갱신 (O(1))"""
+        history = self.rssi_history[ap_name]
+        if len(history) == history.maxlen:
+            self._rssi_sum[ap_name] -= history[0]
+        history.append(rssi)
+        self._rssi_sum[ap_name] += rssi
+    
     def scan_sync(self, duration: float = 2.0) -> Dict[str, float]:
         """
         동기 방식 스캔 (메인 스레드에서 사용)
@@ -99,12 +124,16 @@ class ArubaBLEScanner:
         Returns:
             AP별 RSSI 딕셔너리
         """
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self.scan_once(duration))
-        finally:
-            loop.close()
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            # 스캐너를 붙잡지 않고 루프만 참조 (스캐너가 수거되거나 프로세스 종료 시 닫힘)
+            self._loop_finalizer = weakref.finalize(self, self._loop.close)
+        return self._loop.run_until_complete(self.scan_once(duration))
+    
+    def close(self):
+        """이벤트 루프 정리 (scan_sync를 쓰지 않았으면 할 일 없음)"""
+        if self._loop_finalizer is not None:
+            self._loop_finalizer()
     
     def get_last_rssi(self) -> Dict[str, float]:
         """마지막 스캔 결과 반환"""
@@ -128,6 +157,7 @@ class ArubaBLEScanner:
         """RSSI 히스토리 초기화"""
         for ap_name in self.rssi_history:
             self.rssi_history[ap_name].clear()
+            self._rssi_sum[ap_name] = 0.0
         self.last_rssi = {}
 
 
@@ -140,43 +170,37 @@ class SimulatedScanner:
     def __init__(self):
         self.current_position = (35.0, 5.0)  # 시작 위치
         self.last_rssi = {}
+        self._rng = np.random.default_rng()
         
     def set_position(self, x: float, y: float):
         """현재 위치 설정 (시뮬레이션용)"""
         self.current_position = (x, y)
+    
+    def close(self):
+        """정리할 자원 없음 (ArubaBLEScanner.close와 같은 인터페이스)"""
+    
+    async def scan_once(self, duration: float = 1.0) -> Dict[str, float]:
+        """비동기 스캔 (ArubaBLEScanner.scan_once와 같은 인터페이스)"""
+        return self.scan_sync(duration)
         
     def scan_sync(self, duration: float = 1.0) -> Dict[str, float]:
         """
-        가상 RSSI 값 생성 (거리 기반)
+        가상 RSSI 값 생성 (거리 기반, 전체 AP 벡터 연산)
         """
-        import math
-        import random
+        # 거리 계산 (최소 거리 0.5m)
+        diff = AP_POSITIONS_ARR - np.array(self.current_position, dtype=np.float32)
+        distance = np.sqrt(np.einsum('ij,ij->i', diff, diff)).clip(min=0.5)
         
-        result = {}
-        x, y = self.current_position
+        # Log-distance path loss model로 RSSI 계산 + 노이즈
+        tx_power = -59
+        path_loss = 2.5
+        rssi = tx_power - 10 * path_loss * np.log10(distance)
+        rssi += self._rng.normal(0, 3, distance.size)
         
-        for ap_name, ap_info in ARUBA_APS.items():
-            ap_x, ap_y = ap_info["position"]
-            
-            # 거리 계산
-            distance = math.sqrt((x - ap_x)**2 + (y - ap_y)**2)
-            
-            # Log-distance path loss model로 RSSI 계산
-            if distance < 0.5:
-                distance = 0.5  # 최소 거리
-            
-            tx_power = -59
-            path_loss = 2.5
-            rssi = tx_power - 10 * path_loss * math.log10(distance)
-            
-            # 노이즈 추가
-            rssi += random.gauss(0, 3)
-            
-            # 범위 제한
-            rssi = max(min(rssi, -30), RSSI_MIN)
-            
-            result[ap_name] = rssi
+        # 범위 제한
+        rssi = rssi.clip(RSSI_MIN, -30)
         
+        result = dict(zip(AP_NAMES_ARR, rssi.tolist()))
         self.last_rssi = result
         return result
     
@@ -13,14 +13,7 @@ except:
     print("❌ CoreWLAN 없음. pip install pyobjc-framework-CoreWLAN")
     exit(1)
 
-def normalize_mac(mac):
-    if not mac:
-        return ""
-    mac = mac.upper().replace("-", ":").replace(".", ":")
-    mac_clean = mac.replace(":", "")
-    if len(mac_clean) == 12:
-        return ":".join(mac_clean[i:i+2] for i in range(0, 12, 2))
-    return mac
+from wifi_scanner import normalize_mac
 
 print("=" * 60)
 print("🚶 AP 수집 - 복도 걸으면서 실행")
@@ -4,24 +4,18 @@
 연결된 AP가 바뀔 때마다 자동 기록
 """
 
+import sys
 import time
 import json
+import selectors
 from datetime import datetime
 from CoreWLAN import CWWiFiClient
+from wifi_scanner import normalize_mac
 
 # 수집된 AP 저장
 collected_aps = {}
 trajectory = []
 
-def normalize_mac(mac):
-    if not mac:
-        return ""
-    mac = mac.upper().replace("-", ":").replace(".", ":")
-    mac_clean = mac.replace(":", "")
-    if len(mac_clean) == 12:
-        return ":".join(mac_clean[i:i+2] for i in range(0, 12, 2))
-    return mac
-
 print("=" * 70)
 print("🚶 복도 걸으면서 AP 수집")
 print("=" * 70)
@@ -42,12 +36,20 @@ if not interface:
 print(f"✅ WiFi 인터페이스: {interface.interfaceName()}")
 print("\n🎬 수집 시작! (Ctrl+C 또는 'q'로 종료)\n")
 
+POLL_INTERVAL = 0.5  # WiFi 폴링 주기 (초)
+
 last_bssid = None
 start_time = time.time()
 count = 0
 
+# stdin 입력 대기와 폴링 타이머를 하나의 select로 처리
+sel = selectors.DefaultSelector()
+sel.register(sys.stdin, selectors.EVENT_READ)
+next_poll = time.monotonic()
+running = True
+
 try:
-    while True:
+    while running:
         # 현재 연결 정보
         ssid = interface.ssid()
         bssid = normalize_mac(interface.bssid() or "")
@@ -98,20 +100,26 @@ try:
                 if bssid in collected_aps:
                     collected_aps[bssid]["rssi_samples"].append(rssi)
         
-        # 비동기 입력 체크 (타임아웃 없이)
-        import select
-        import sys
-        
-        if select.select([sys.stdin], [], [], 0.5)[0]:
-            user_input = sys.stdin.readline().strip()
-            if user_input.lower() == 'q':
+        # 다음 폴링 시각까지 입력 대기 (입력은 즉시 처리, 폴링 주기는 monotonic 기준으로 고정)
+        next_poll = max(next_poll + POLL_INTERVAL, time.monotonic())
+        while running:
+            timeout = next_poll - time.monotonic()
+            if timeout <= 0:
                 break
+            if not sel.select(timeout):
+                continue
+            line = sys.stdin.readline()
+            if not line:
+                # stdin 닫힘 (EOF) - 이후로는 타이머만 사용
+                sel.unregister(sys.stdin)
+                continue
+            user_input = line.strip()
+            if user_input.lower() == 'q':
+                running = False
             elif user_input and bssid:
                 collected_aps[bssid]["location_hint"] = user_input
                 print(f"   ✅ 위치 기록: {user_input}")
         
-        time.sleep(0.5)
-        
 except KeyboardInterrupt:
     print("\n\n⏹️ 수집 중단")
 
@@ -9,6 +9,9 @@ Aruba AP 기반 실내 위치 추정 시스템 설정
 import json
 import os
 
+import numpy as np
+from scipy.spatial import cKDTree
+
 # ============================================================
 # 호실 좌표 데이터 로드
 # ============================================================
@@ -31,6 +34,16 @@ if ROOM_DATA:
     for room in ROOM_DATA.get("rooms", []):
         ROOM_CENTROIDS[room["room"]] = tuple(room["centroid_m"])
 
+# 최근접 호실 검색용 KD-tree
+# 중심 좌표가 같은 호실이 여럿이면 먼저 나온 호실만 사용 (기존 선형 탐색과 동일한 결과)
+_room_names = list(ROOM_CENTROIDS.keys())
+_ROOM_XY, _first_idx = np.unique(
+    np.array(list(ROOM_CENTROIDS.values()), dtype=np.float64).reshape(-1, 2),
+    axis=0, return_index=True
+)
+_ROOM_KEYS = [_room_names[i] for i in _first_idx]
+_ROOM_TREE = cKDTree(_ROOM_XY) if ROOM_CENTROIDS else None
+
 # ============================================================
 # Aruba AP 정보 (BLE MAC 주소)
 # 좌표: 7415 원점 기준
@@ -104,6 +117,7 @@ ARUBA_APS = {
 
 # BLE MAC 주소 리스트 (스캔용)
 BLE_MAC_LIST = [ap["ble_mac"].upper() for ap in ARUBA_APS.values()]
+BLE_MAC_SET = frozenset(BLE_MAC_LIST)  # O(1) 멤버십 조회용
 
 # AP 이름과 BLE MAC 매핑
 BLE_MAC_TO_AP = {ap["ble_mac"].upper(): name for name, ap in ARUBA_APS.items()}
@@ -112,6 +126,13 @@ AP_TO_BLE_MAC = {name: ap["ble_mac"].upper() for name, ap in ARUBA_APS.items()}
 # AP 위치 좌표
 AP_POSITIONS = {name: ap["position"] for name, ap in ARUBA_APS.items()}
 
+# AP 이름/좌표 배열 (벡터 연산용, 같은 순서)
+# 좌표는 모든 모듈이 공유하는 (N, 2) float32 C-연속 배열, 실수로 덮어쓰지 않도록 읽기 전용
+AP_NAMES_ARR = list(AP_POSITIONS.keys())
+AP_POSITIONS_ARR = np.ascontiguousarray(list(AP_POSITIONS.values()), dtype=np.float32).reshape(-1, 2)
+AP_POSITIONS_ARR.flags.writeable = False
+AP_INDEX = {name: i for i, name in enumerate(AP_NAMES_ARR)}  # AP 이름 → 배열 행
+
 # ============================================================
 # RSSI → 거리 변환 파라미터
 # ============================================================
@@ -159,11 +180,16 @@ CORRIDORS = {
     }
 }
 
+# 복도 경계 (이름, x_min, x_max, y_min, y_max)
+_CORRIDOR_BOUNDS = tuple(
+    (name, *c["x_range"], *c["y_range"]) for name, c in CORRIDORS.items()
+)
+
 # ============================================================
 # 로그 설정
 # ============================================================
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
-LOG_FILE = os.path.join(LOG_DIR, "position_log.json")
+LOG_FILE = os.path.join(LOG_DIR, "position_log.ndjson")
 TRAJECTORY_FILE = os.path.join(LOG_DIR, "trajectory.json")
 
 # 로그 디렉토리 생성
@@ -172,16 +198,39 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # ============================================================
 # 유틸리티 함수
 # ============================================================
+# 정수 dBm → 거리 테이블, 인덱스 = -rssi (0 ~ -RSSI_MIN)
+# rssi = 0 (인덱스 0)은 유효하지 않은 값이므로 MAX_DISTANCE
+_RSSI_LUT = np.array(
+    [MAX_DISTANCE] + [min(10 ** ((TX_POWER + i) / (10 * PATH_LOSS_EXPONENT)), MAX_DISTANCE)
+                      for i in range(1, -RSSI_MIN + 1)],
+    dtype=np.float64
+)
+# 스칼라 조회용 Python float 목록 (NumPy 스칼라 생성 없이 바로 반환)
+_RSSI_TABLE = _RSSI_LUT.tolist()
+
+
 def rssi_to_distance(rssi):
     """
     RSSI 값을 거리(미터)로 변환
-    Log-distance path loss model 사용
+    Log-distance path loss model 사용 (정수 dBm 단위로 반올림해 테이블 조회)
     """
-    if rssi >= 0 or rssi < RSSI_MIN:
+    if not -1e6 < rssi < 1e6:  # NaN/무한대 (int 변환 불가) → 범위 밖
         return MAX_DISTANCE
-    
-    distance = 10 ** ((TX_POWER - rssi) / (10 * PATH_LOSS_EXPONENT))
-    return min(distance, MAX_DISTANCE)
+    r = int(round(rssi))
+    if r >= 0 or r < RSSI_MIN:
+        return MAX_DISTANCE
+    return _RSSI_TABLE[-r]
+
+
+def rssi_to_distance_vec(rssi):
+    """
+    RSSI 배열 → 거리 배열 (rssi_to_distance의 배치 버전)
+    여러 AP의 RSSI를 한 번에 변환
+    """
+    idx = -np.rint(np.asarray(rssi, dtype=np.float64))
+    # 범위 밖(rssi >= 0 또는 < RSSI_MIN, NaN)은 인덱스 0 → MAX_DISTANCE
+    idx = np.where((idx > 0) & (idx <= -RSSI_MIN), idx, 0).astype(np.intp)
+    return _RSSI_LUT[idx]
 
 
 def get_ap_by_mac(ble_mac):
@@ -200,26 +249,15 @@ def get_nearest_room(x, y):
     if not ROOM_CENTROIDS:
         return None
     
-    import math
-    min_dist = float('inf')
-    nearest_room = None
-    
-    for room_num, centroid in ROOM_CENTROIDS.items():
-        dist = math.sqrt((x - centroid[0])**2 + (y - centroid[1])**2)
-        if dist < min_dist:
-            min_dist = dist
-            nearest_room = room_num
-    
-    return nearest_room
+    _, i = _ROOM_TREE.query((x, y), k=1)
+    return _ROOM_KEYS[i]
 
 
 def get_corridor(x, y):
     """
     좌표가 어느 복도에 있는지 확인
     """
-    for name, corridor in CORRIDORS.items():
-        x_min, x_max = corridor["x_range"]
-        y_min, y_max = corridor["y_range"]
+    for name, x_min, x_max, y_min, y_max in _CORRIDOR_BOUNDS:
         if x_min <= x <= x_max and y_min <= y <= y_max:
             return name
     return None
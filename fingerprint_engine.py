@@ -4,11 +4,26 @@ WiFi Fingerprinting Engine
 RSSI 패턴 기반 실내 위치 추정
 """
 
-import json
+import hashlib
 import os
 import math
+import threading
+import time
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from heapq import nlargest
+
+import numpy as np
+import orjson
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba 미설치 시 순수 Python으로 실행
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
 
 try:
     from CoreWLAN import CWWiFiClient
@@ -19,18 +34,82 @@ except:
     USE_WIFI = False
     interface = None
 
-# Fingerprint 데이터베이스
+# Fingerprint 데이터베이스 (처음 사용할 때 get_db()가 로드)
 fingerprint_db = {}
+_db_loaded = False
 DB_FILE = "logs/fingerprint_db.json"
+DB_LOG_FILE = "logs/fingerprint_db.jsonl"  # add_fingerprint 추가분 (DB_FILE에 주기적으로 병합)
+DB_LOG_COMPACT = 50                        # 추가분이 이만큼 쌓이면 DB_FILE로 병합
+KEEP_RAW_PATTERNS = False                  # True면 raw_patterns도 디스크에 저장 (디버그용)
+MATRIX_FILE = "logs/fp_matrix.npy"   # KNN 행렬 (int8)
+INDEX_FILE = "logs/fp_index.json"    # 행 → 위치, 행별 패턴 길이
 
-def scan_rssi_pattern(top_n=10):
+# KNN용 SoA 행렬 상태 (fingerprint_db에서 _rebuild_matrix()로 생성)
+# 스캔 스레드가 추정하는 동안 요청 스레드가 DB를 갱신하므로,
+# 새 상태를 지역 변수로 모두 만든 뒤 _STATE에 한 번에 교체 (읽는 쪽은 호출마다 _STATE를 한 번만 참조)
+_KnnState = namedtuple("_KnnState", [
+    "locs",      # 행 → 위치
+    "matrix",    # (M, L) int8 RSSI 패턴, 짧은 패턴은 0으로 채움
+    "lens",      # 행별 패턴 길이
+    "cumsq",     # 행별 제곱 누적합 (앞 n개 노름 계산용)
+    "buckets",   # 최강 RSSI 대역 → 행 인덱스 배열
+    "sigs",      # 행별 AP 순서 SimHash
+    "has_sig",   # 서명 없는 행(구버전 DB)은 필터 통과
+    "hist",      # (M, L, 101) 순위별 RSSI 분포 (평활화, 합 1)
+    "has_hist",
+    "ap_cols",   # AP별 RSSI 벡터: MAC → 열 인덱스
+    "ap_rows",   # ap_mat 행 → locs 행 (ap_rssi 있는 위치만)
+    "ap_mat",    # (N, 열 수) float32, 미감지 AP는 RSS_PAD
+])
+_DB_WRITE_LOCK = threading.RLock()  # DB 로드/추가/저장끼리 직렬화 (추정은 잠금 없이 _STATE만 읽음)
+RSS_PAD = -110.0      # 미감지 AP 대체값 (dBm)
+
+BUCKET_DB = 5         # 버킷 폭 (dBm), 최강 RSSI 기준
+SIG_TOP_K = 5         # 서명에 쓰는 상위 AP 수
+SIG_MAX_HAMMING = 12  # 서명 필터 허용 해밍 거리 (64비트 중)
+
+HIST_BINS = 101       # 0 ~ -100 dBm, 인덱스 = -rssi
+HIST_SIGMA = 2.0      # 히스토그램 평활화 폭 (dB)
+USE_HIST_DISTANCE = True  # 모든 후보에 히스토그램이 있으면 히스토그램 거리로 순위 결정
+
+_STATE = _KnnState(
+    locs=[],
+    matrix=np.zeros((0, 0), dtype=np.int8),
+    lens=np.zeros(0, dtype=np.intp),
+    cumsq=np.zeros((0, 0), dtype=np.float32),
+    buckets={},
+    sigs=np.zeros(0, dtype=np.uint64),
+    has_sig=np.zeros(0, dtype=bool),
+    hist=np.zeros((0, 0, HIST_BINS), dtype=np.float32),
+    has_hist=np.zeros(0, dtype=bool),
+    ap_cols={},
+    ap_rows=np.zeros(0, dtype=np.intp),
+    ap_mat=np.zeros((0, 0), dtype=np.float32),
+)
+
+# 최근접 거리 → 신뢰도 (거리 < 5: 0.95, < 10: 0.8, < 20: 0.6, 그 외: 0.3)
+_CONF_THRESH = np.array([5, 10, 20], dtype=np.float64)
+_CONF_VAL = np.array([0.95, 0.8, 0.6, 0.3], dtype=np.float64)
+
+SCAN_TTL = 0.2        # 스캔 결과 재사용 시간 (초)
+_last_scan_time = 0.0
+_last_scan = []       # 최근 스캔 (MAC, RSSI), 강한 신호부터
+
+def scan_rssi_pairs(top_n=10):
     """
-    주변 AP들의 RSSI 패턴 스캔
-    상위 N개 RSSI를 정렬된 벡터로 반환
+    주변 AP들의 (MAC, RSSI) 스캔
+    강한 신호부터 상위 N개 반환
     """
+    global _last_scan_time, _last_scan
+    
     if not USE_WIFI or not interface:
         return []
     
+    # TTL 안이면 직전 스캔 재사용 (CoreWLAN 스캔 생략)
+    now = time.monotonic()
+    if now - _last_scan_time < SCAN_TTL:
+        return _last_scan[:top_n]
+    
     try:
         # 스캔 실행
         networks, error = interface.scanForNetworksWithSSID_error_(None, None)
@@ -39,36 +118,79 @@ def scan_rssi_pattern(top_n=10):
             # 캐시 사용
             networks = interface.cachedScanResults() or []
         
-        # RSSI 값만 추출
-        rssi_list = []
+        # 유효한 값만
+        pairs = []
         for network in networks:
             rssi = network.rssiValue()
-            if rssi and rssi > -100:  # 유효한 값만
-                rssi_list.append(rssi)
+            if rssi and rssi > -100:
+                pairs.append((network.bssid(), rssi))
         
         # 정렬 (강한 신호부터)
-        rssi_list.sort(reverse=True)
+        pairs.sort(key=lambda p: p[1], reverse=True)
+        
+        _last_scan_time, _last_scan = time.monotonic(), pairs
         
         # 상위 N개 반환
-        return rssi_list[:top_n]
+        return pairs[:top_n]
     
     except Exception as e:
         print(f"스캔 에러: {e}")
         return []
 
+def scan_rssi_pattern(top_n=10):
+    """
+    주변 AP들의 RSSI 패턴 스캔
+    상위 N개 RSSI를 정렬된 벡터로 반환
+    """
+    return [rssi for _, rssi in scan_rssi_pairs(top_n)]
+
+def ordered_signature(macs):
+    """
+    AP MAC 순서 기반 64비트 SimHash
+    상위 AP일수록 가중치가 크고, 인접 AP 쌍의 순서도 특징으로 사용
+    MAC을 알 수 없으면 None
+    """
+    macs = [m.lower() for m in macs[:SIG_TOP_K] if m]
+    if not macs:
+        return None
+    
+    features = [(mac, SIG_TOP_K - i) for i, mac in enumerate(macs)]
+    features += [(f"{a}>{b}", 1) for a, b in zip(macs, macs[1:])]
+    
+    acc = np.zeros(64, dtype=np.int32)
+    bits = np.arange(64, dtype=np.uint64)
+    for token, weight in features:
+        h = np.uint64(int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little'))
+        acc += np.where((h >> bits) & np.uint64(1), weight, -weight).astype(np.int32)
+    
+    return int((acc > 0).astype(np.uint64) @ (np.uint64(1) << bits))
+
+def scan_with_signature(top_n=10):
+    """RSSI 패턴 + AP 순서 서명 스캔"""
+    pairs = scan_rssi_pairs(top_n)
+    return [rssi for _, rssi in pairs], ordered_signature([mac for mac, _ in pairs])
+
 def collect_fingerprint(location, samples=10, top_n=10):
     """
     특정 위치에서 Fingerprint 수집
     여러 번 스캔해서 평균 패턴 생성
     """
     all_patterns = []
+    mac_rssi = defaultdict(list)
+    
+    # 샘플 간격 0.3초 (스캔 시간 포함, 남은 시간만 대기)
+    interval = 0.3
+    next_at = time.monotonic()
     
     for i in range(samples):
-        pattern = scan_rssi_pattern(top_n)
-        if pattern:
-            all_patterns.append(pattern)
-        import time
-        time.sleep(0.3)
+        pairs = scan_rssi_pairs(top_n)
+        if pairs:
+            all_patterns.append([rssi for _, rssi in pairs])
+            for mac, rssi in pairs:
+                if mac:
+                    mac_rssi[mac].append(rssi)
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.monotonic()))
     
     if not all_patterns:
         return None
@@ -80,10 +202,18 @@ def collect_fingerprint(location, samples=10, top_n=10):
         if values:
             avg_pattern.append(round(sum(values) / len(values)))
     
+    # AP별 평균 RSSI, AP 순서 서명 (평균 RSSI 상위 SIG_TOP_K개만 선택, 전체 정렬 불필요)
+    mean_rssi = {mac: sum(v) / len(v) for mac, v in mac_rssi.items()}
+    ap_rssi = {mac.lower(): round(m, 1) for mac, m in mean_rssi.items()}
+    ranked = nlargest(SIG_TOP_K, mean_rssi, key=mean_rssi.get)
+    
     # 통계
     fingerprint = {
         "location": location,
         "pattern": avg_pattern,
+        "signature": ordered_signature(ranked),
+        "ap_rssi": ap_rssi,
+        "hist": pattern_hist(all_patterns),
         "samples": samples,
         "timestamp": datetime.now().isoformat(),
         "raw_patterns": all_patterns
@@ -91,112 +221,540 @@ def collect_fingerprint(location, samples=10, top_n=10):
     
     return fingerprint
 
+def pattern_hist(patterns):
+    """
+    여러 번 스캔한 패턴 → 순위별 RSSI 히스토그램
+    [[[rssi, count], ...], ...] (순위마다 희소 목록)
+    """
+    width = max((len(p) for p in patterns), default=0)
+    hist = []
+    for i in range(width):
+        values = np.array([p[i] for p in patterns if i < len(p)], dtype=np.intp)
+        rssi, counts = np.unique(values, return_counts=True)
+        hist.append([[int(r), int(c)] for r, c in zip(rssi, counts)])
+    return hist
+
+def _dense_hist(hist, width):
+    """희소 히스토그램 → (width, HIST_BINS) 평활화 분포"""
+    dense = np.zeros((width, HIST_BINS), dtype=np.float32)
+    for i, slot in enumerate(hist[:width]):
+        for rssi, count in slot:
+            dense[i, int(np.clip(-rssi, 0, HIST_BINS - 1))] += count
+    
+    # 가우시안 평활화 (한 번의 측정값과 비교하므로 ±몇 dB 흔들림 흡수)
+    offsets = np.arange(-3 * int(HIST_SIGMA), 3 * int(HIST_SIGMA) + 1)
+    kernel = np.exp(-0.5 * (offsets / HIST_SIGMA) ** 2)
+    dense = np.apply_along_axis(np.convolve, 1, dense, kernel, mode='same')
+    
+    totals = dense.sum(axis=1, keepdims=True)
+    return np.divide(dense, totals, out=np.zeros_like(dense), where=totals > 0)
+
 def euclidean_distance(pattern1, pattern2):
     """유클리드 거리 계산"""
-    if not pattern1 or not pattern2:
+    if pattern1 is None or pattern2 is None or len(pattern1) == 0 or len(pattern2) == 0:
         return float('inf')
     
     # 길이 맞추기
     min_len = min(len(pattern1), len(pattern2))
     
-    sum_sq = 0
-    for i in range(min_len):
-        sum_sq += (pattern1[i] - pattern2[i]) ** 2
-    
-    return math.sqrt(sum_sq)
+    diff = np.asarray(pattern1[:min_len], dtype=np.float64) - np.asarray(pattern2[:min_len], dtype=np.float64)
+    return float(np.sqrt(diff @ diff))
 
 def cosine_similarity(pattern1, pattern2):
     """코사인 유사도 계산"""
-    if not pattern1 or not pattern2:
+    if pattern1 is None or pattern2 is None or len(pattern1) == 0 or len(pattern2) == 0:
         return 0
     
     min_len = min(len(pattern1), len(pattern2))
     
-    dot_product = sum(pattern1[i] * pattern2[i] for i in range(min_len))
-    norm1 = math.sqrt(sum(x**2 for x in pattern1[:min_len]))
-    norm2 = math.sqrt(sum(x**2 for x in pattern2[:min_len]))
+    p1 = np.asarray(pattern1[:min_len], dtype=np.float64)
+    p2 = np.asarray(pattern2[:min_len], dtype=np.float64)
+    norm1 = np.linalg.norm(p1)
+    norm2 = np.linalg.norm(p2)
     
     if norm1 == 0 or norm2 == 0:
         return 0
     
-    return dot_product / (norm1 * norm2)
+    return float(p1 @ p2 / (norm1 * norm2))
+
+def _rebuild_matrix():
+    """fingerprint_db → SoA 행렬 재구성 (DB 로드/저장 시 호출)"""
+    locs = list(fingerprint_db.keys())
+    patterns = [fingerprint_db[loc].get("pattern", []) for loc in locs]
+    width = max((len(p) for p in patterns), default=0)
+    
+    matrix = np.zeros((len(locs), width), dtype=np.int8)
+    for i, pattern in enumerate(patterns):
+        matrix[i, :len(pattern)] = np.rint(pattern)
+    
+    _set_matrix(locs, matrix, [len(p) for p in patterns])
+
+def _set_matrix(locs, matrix, lengths):
+    """KNN 행렬 전역 상태 교체 (지역 변수로 모두 만든 뒤 한 번에 대입)"""
+    global _STATE
+    
+    lens = np.array(lengths, dtype=np.intp)
+    cumsq = np.cumsum(np.asarray(matrix, dtype=np.float32) ** 2, axis=1)
+    
+    # 최강 RSSI 대역별로 행 묶기 (빈 패턴은 버킷 없음 → 전체 스캔에서만 비교)
+    buckets = {}
+    if matrix.shape[1] > 0:
+        keys = np.asarray(matrix[:, 0], dtype=np.intp) // BUCKET_DB
+        for row in np.flatnonzero(lens > 0):
+            buckets.setdefault(int(keys[row]), []).append(row)
+    buckets = {b: np.array(rows, dtype=np.intp) for b, rows in buckets.items()}
+    
+    fps = [fingerprint_db[loc] for loc in locs]
+    sigs = [fp.get("signature") for fp in fps]
+    
+    width = matrix.shape[1]
+    hists = [fp.get("hist") for fp in fps]
+    hist = np.zeros((len(locs), width, HIST_BINS), dtype=np.float32)
+    for i, h in enumerate(hists):
+        if h:
+            hist[i] = _dense_hist(h, width)
+    
+    # AP별 RSSI 행렬 (N, M) float32 (float64 대비 거리 계산 시 메모리 이동량 절반)
+    ap_rows = [i for i, fp in enumerate(fps) if fp.get("ap_rssi")]
+    ap_cols = {}
+    for i in ap_rows:
+        for mac in fps[i]["ap_rssi"]:
+            ap_cols.setdefault(mac, len(ap_cols))
+    ap_mat = np.full((len(ap_rows), len(ap_cols)), RSS_PAD, dtype=np.float32)
+    for r, i in enumerate(ap_rows):
+        for mac, rssi in fps[i]["ap_rssi"].items():
+            ap_mat[r, ap_cols[mac]] = rssi
+    
+    _STATE = _KnnState(
+        locs=list(locs),
+        matrix=matrix,
+        lens=lens,
+        cumsq=cumsq,
+        buckets=buckets,
+        sigs=np.array([sig or 0 for sig in sigs], dtype=np.uint64),
+        has_sig=np.array([sig is not None for sig in sigs], dtype=bool),
+        hist=hist,
+        has_hist=np.array([bool(h) for h in hists], dtype=bool),
+        ap_cols=ap_cols,
+        ap_rows=np.array(ap_rows, dtype=np.intp),
+        ap_mat=ap_mat,
+    )
+
+def _append_matrix(location):
+    """
+    추가된 위치 한 행만 계산해 현재 KNN 상태에 이어 붙이기 (np.concatenate)
+    이미 있는 위치면 같은 자리의 행만 교체 (다른 행의 히스토그램은 다시 만들지 않음)
+    """
+    global _STATE
+    
+    st = _STATE
+    fp = fingerprint_db[location]
+    pattern = fp.get("pattern", [])
+    i = st.locs.index(location) if location in st.locs else len(st.locs)
+    locs = st.locs[:i] + [location] + st.locs[i + 1:]
+    
+    # 새 패턴이 더 길면 기존 행을 0으로, 분포를 빈 순위로 넓힘
+    width = max(st.matrix.shape[1], len(pattern))
+    pad = width - st.matrix.shape[1]
+    row = np.zeros(width, dtype=np.int8)
+    row[:len(pattern)] = np.rint(pattern)
+    h = fp.get("hist")
+    row_hist = _dense_hist(h, width) if h else np.zeros((width, HIST_BINS), dtype=np.float32)
+    sig = fp.get("signature")
+    
+    def put(a, v):
+        return np.concatenate((a[:i], np.asarray(v, dtype=a.dtype)[None], a[i + 1:]))
+    
+    matrix = put(np.pad(st.matrix, ((0, 0), (0, pad))), row)
+    lens = put(st.lens, len(pattern))
+    cumsq = np.cumsum(matrix.astype(np.float32) ** 2, axis=1)
+    
+    # 최강 RSSI 대역 버킷 (정수 연산뿐이라 전체 다시 묶음)
+    buckets = {}
+    if width > 0:
+        keys = matrix[:, 0].astype(np.intp) // BUCKET_DB
+        for r in np.flatnonzero(lens > 0):
+            buckets.setdefault(int(keys[r]), []).append(r)
+    buckets = {b: np.array(rows, dtype=np.intp) for b, rows in buckets.items()}
+    
+    # AP별 RSSI 행렬: 교체되는 행을 빼고, 새 MAC은 RSS_PAD 열로 추가한 뒤 행 삽입
+    keep = st.ap_rows != i
+    ap_rows, ap_mat = st.ap_rows[keep], st.ap_mat[keep]
+    ap_cols = st.ap_cols
+    if not keep.all():
+        # 교체된 행에만 있던 AP 열 제거 (전체 재구성과 같은 열 집합)
+        used = (ap_mat != RSS_PAD).any(axis=0)
+        ap_mat = ap_mat[:, used]
+        ap_cols = {mac: n for n, mac in enumerate(m for m, c in ap_cols.items() if used[c])}
+    ap_rssi = fp.get("ap_rssi")
+    if ap_rssi:
+        ap_cols = dict(ap_cols)
+        for mac in ap_rssi:
+            ap_cols.setdefault(mac, len(ap_cols))
+        ap_row = np.full(len(ap_cols), RSS_PAD, dtype=np.float32)
+        for mac, rssi in ap_rssi.items():
+            ap_row[ap_cols[mac]] = rssi
+        ap_mat = np.pad(ap_mat, ((0, 0), (0, len(ap_cols) - ap_mat.shape[1])), constant_values=RSS_PAD)
+        j = np.searchsorted(ap_rows, i)
+        ap_rows = np.insert(ap_rows, j, i)
+        ap_mat = np.insert(ap_mat, j, ap_row, axis=0)
+    
+    _STATE = _KnnState(
+        locs=locs,
+        matrix=matrix,
+        lens=lens,
+        cumsq=cumsq,
+        buckets=buckets,
+        sigs=put(st.sigs, sig or 0),
+        has_sig=put(st.has_sig, sig is not None),
+        hist=put(np.pad(st.hist, ((0, 0), (0, pad), (0, 0))), row_hist),
+        has_hist=put(st.has_hist, bool(h)),
+        ap_cols=ap_cols,
+        ap_rows=ap_rows,
+        ap_mat=ap_mat,
+    )
+
+def _candidate_rows(st, strongest, k):
+    """
+    쿼리 최강 RSSI와 같은/인접 버킷의 행만 후보로 선택
+    후보가 K개 미만이면 전체 행
+    """
+    b = int(strongest) // BUCKET_DB
+    parts = [st.buckets[key] for key in (b - 1, b, b + 1) if key in st.buckets]
+    if parts:
+        rows = np.concatenate(parts)
+        if len(rows) >= k:
+            return rows
+    return np.arange(len(st.locs))
+
+def _signature_filter(st, rows, signature, k):
+    """
+    AP 순서 서명의 해밍 거리로 후보 행 축소
+    후보가 K개 미만이면 그대로
+    """
+    xor = st.sigs[rows] ^ np.uint64(signature)
+    hd = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+    keep = rows[(hd <= SIG_MAX_HAMMING) | ~st.has_sig[rows]]
+    return keep if len(keep) >= k else rows
+
+def _save_matrix():
+    """
+    KNN 행렬을 int8 .npy + 인덱스 JSON으로 저장
+    임시 파일에 쓴 뒤 os.replace로 교체 (읽는 중인 파일을 제자리에서 자르지 않음)
+    """
+    st = _STATE
+    with open(MATRIX_FILE + ".tmp", 'wb') as f:
+        np.save(f, st.matrix)
+    with open(INDEX_FILE + ".tmp", 'wb') as f:
+        f.write(orjson.dumps({"locations": st.locs, "lengths": st.lens},
+                             option=orjson.OPT_SERIALIZE_NUMPY))
+    os.replace(MATRIX_FILE + ".tmp", MATRIX_FILE)
+    os.replace(INDEX_FILE + ".tmp", INDEX_FILE)
+
+def _load_matrix():
+    """
+    저장된 KNN 행렬 로드 (패턴 반올림/패딩 생략, 파생 배열은 _set_matrix에서 계산)
+    DB보다 오래됐거나 위치 목록/행 수가 다르면 False (재구성 필요)
+    """
+    try:
+        matrix_mtime = os.path.getmtime(MATRIX_FILE)
+        if matrix_mtime < os.path.getmtime(DB_FILE):
+            return False
+        if os.path.exists(DB_LOG_FILE) and matrix_mtime < os.path.getmtime(DB_LOG_FILE):
+            return False
+        with open(INDEX_FILE, 'rb') as f:
+            index = orjson.loads(f.read())
+        if index["locations"] != list(fingerprint_db.keys()):
+            return False
+        matrix = np.load(MATRIX_FILE)
+    except (OSError, ValueError, KeyError):
+        return False
+    if matrix.ndim != 2 or len(matrix) != len(index["locations"]):
+        return False
+    
+    _set_matrix(index["locations"], matrix, index["lengths"])
+    return True
 
-def estimate_location_knn(current_pattern, k=3):
+@njit(cache=True, fastmath=True)
+def _knn_kernel(db, lens, rows, q, q_len):
+    """
+    KNN 거리 커널 (Numba JIT)
+    후보 행마다 앞 n = min(저장 길이, 쿼리 길이)개 성분의 제곱거리와 내적을 한 번에 계산
+    
+    Args:
+        db: RSSI 행렬 (M, L) int8
+        lens: 행별 패턴 길이 (M,)
+        rows: 후보 행 인덱스 (m,)
+        q: 쿼리 (L,) float32, q_len 이후는 0
+        q_len: 쿼리 길이
+        
+    Returns:
+        (제곱거리 (m,), 내적 (m,), 비교 길이 n (m,))
+    """
+    m = rows.shape[0]
+    d2 = np.empty(m, dtype=np.float32)
+    dot = np.empty(m, dtype=np.float32)
+    n = np.empty(m, dtype=np.intp)
+    for r in range(m):
+        i = rows[r]
+        k = min(lens[i], q_len)
+        s = 0.0
+        p = 0.0
+        for j in range(k):
+            v = np.float32(db[i, j])
+            t = v - q[j]
+            s += t * t
+            p += v * q[j]
+        d2[r] = s
+        dot[r] = p
+        n[r] = k
+    return d2, dot, n
+
+def warmup():
+    """JIT 커널 미리 컴파일 (첫 추정 지연 방지)"""
+    _knn_kernel(np.zeros((1, 1), dtype=np.int8), np.ones(1, dtype=np.intp),
+                np.zeros(1, dtype=np.intp), np.zeros(1, dtype=np.float32), 1)
+
+def knn_confidence(distance):
+    """최근접 거리 → 신뢰도 (스칼라/배열 모두 가능)"""
+    return _CONF_VAL[np.searchsorted(_CONF_THRESH, distance, side='right')]
+
+def estimate_location_knn(current_pattern, k=3, signature=None):
     """
     KNN 알고리즘으로 위치 추정
     가장 유사한 K개 위치의 가중 평균
+    (후보 행 전체의 거리/유사도를 JIT 커널 한 번으로 계산)
+    signature: ordered_signature() 결과, 있으면 해밍 거리로 먼저 후보 축소
     """
-    if not fingerprint_db or not current_pattern:
+    if not get_db() or not current_pattern:
         return None, 0, []
     
-    # 각 위치와의 거리 계산
-    distances = []
-    for location, data in fingerprint_db.items():
-        stored_pattern = data.get("pattern", [])
-        dist = euclidean_distance(current_pattern, stored_pattern)
-        similarity = cosine_similarity(current_pattern, stored_pattern)
-        distances.append({
-            "location": location,
-            "distance": dist,
-            "similarity": similarity,
-            "pattern": stored_pattern
-        })
-    
-    # 거리순 정렬
-    distances.sort(key=lambda x: x["distance"])
-    
-    # 상위 K개
-    top_k = distances[:k]
-    
-    if not top_k:
+    st = _STATE  # 추정 중 DB가 갱신돼도 같은 상태만 사용
+    width = st.matrix.shape[1]
+    if not st.locs or width == 0 or k <= 0:
         return None, 0, []
     
+    # 버킷으로 후보 행 축소 후 거리 계산
+    rows = _candidate_rows(st, current_pattern[0], k)
+    if signature is not None:
+        rows = _signature_filter(st, rows, signature, k)
+    m = len(rows)
+    
+    # 쿼리를 DB 폭에 맞추기 (비교 길이는 행마다 min(쿼리 길이, 저장 길이))
+    q = np.zeros(width, dtype=np.float32)
+    q_len = min(len(current_pattern), width)
+    q[:q_len] = current_pattern[:q_len]
+    
+    # 유클리드 거리 + 내적 (앞 n개 성분, 커널 한 번)
+    d2, dot, n = _knn_kernel(st.matrix, st.lens, rows, q, q_len)
+    d2 = np.where(n > 0, d2, np.inf)  # 순위는 제곱거리로 충분 (sqrt는 상위 K개만)
+    
+    # 코사인 유사도 (앞 n개 성분)
+    q_cumsq = np.cumsum(q ** 2)
+    last = np.maximum(n - 1, 0)
+    norms = np.sqrt(st.cumsq[rows, last] * q_cumsq[last])
+    valid = (n > 0) & (norms > 0)
+    similarity = np.where(valid, dot / np.where(valid, norms, 1), 0.0)
+    
+    # 순위 기준: 히스토그램 거리 (1 - 쿼리 값의 평균 확률), 없으면 유클리드
+    rank = d2
+    hist_dist = None
+    if USE_HIST_DISTANCE and st.has_hist[rows].all():
+        q_bins = np.clip(-np.rint(q), 0, HIST_BINS - 1).astype(np.intp)
+        prob = st.hist[rows][:, np.arange(width), q_bins]
+        mask = np.arange(width) < n[:, None]
+        score = (prob * mask).sum(axis=1) / np.maximum(n, 1)
+        hist_dist = np.where(n > 0, 1.0 - score, np.inf)
+        rank = hist_dist
+    
+    # 상위 K개 (전체 정렬 없이 선택 후 K개만 정렬)
+    k = min(k, m)
+    top_idx = np.argpartition(rank, k - 1)[:k] if k < m else np.arange(m)
+    top_idx = top_idx[np.lexsort((rows[top_idx], d2[top_idx], rank[top_idx]))]
+    dist = np.sqrt(d2[top_idx])
+    
+    top_k = [
+        {
+            "location": st.locs[rows[i]],
+            "distance": float(d),
+            "similarity": float(similarity[i]),
+            "pattern": fingerprint_db.get(st.locs[rows[i]], {}).get("pattern", [])
+        }
+        for i, d in zip(top_idx, dist)
+    ]
+    if hist_dist is not None:
+        for item, i in zip(top_k, top_idx):
+            item["hist_distance"] = float(hist_dist[i])
+    
     # 가장 가까운 위치
     best_match = top_k[0]
     
     # 신뢰도 계산 (거리 기반)
-    if best_match["distance"] < 5:
-        confidence = 0.95
-    elif best_match["distance"] < 10:
-        confidence = 0.8
-    elif best_match["distance"] < 20:
-        confidence = 0.6
-    else:
-        confidence = 0.3
+    confidence = float(knn_confidence(best_match["distance"]))
     
     return best_match["location"], confidence, top_k
 
+def rssi_vector(pairs, st=None):
+    """
+    (MAC, RSSI) 목록 → AP 열 순서의 float32 벡터
+    DB에 없는 AP는 무시, 감지 안 된 AP는 RSS_PAD
+    st: 열 순서를 가져올 KNN 상태 (없으면 현재 상태)
+    Returns: (벡터, 일치한 AP 수)
+    """
+    if st is None:
+        st = _STATE
+    q = np.full(len(st.ap_cols), RSS_PAD, dtype=np.float32)
+    matched = 0
+    for mac, rssi in pairs:
+        col = st.ap_cols.get(mac.lower()) if mac else None
+        if col is not None:
+            q[col] = rssi
+            matched += 1
+    return q, matched
+
+def estimate_location_vec(pairs, k=5):
+    """
+    AP별 RSSI 벡터 KNN (float32 행렬 전수 비교, L2 거리)
+    pairs: scan_rssi_pairs() 결과 [(MAC, RSSI), ...]
+    DB에 없는 AP는 무시, 쿼리에 없는 AP는 RSS_PAD로 채워 비교
+    K개 이웃의 1/거리 가중 투표로 위치 결정
+    DB의 모든 위치에 ap_rssi가 있을 때만 사용 (일부만 있으면 나머지 위치가 후보에서 빠지므로 None)
+    """
+    if not get_db() or not pairs:
+        return None, 0, []
+    
+    st = _STATE  # 추정 중 DB가 갱신돼도 같은 상태만 사용
+    if not len(st.ap_rows) or len(st.ap_rows) != len(st.locs):
+        return None, 0, []
+    
+    q, matched = rssi_vector(pairs, st)
+    if not matched:
+        return None, 0, []
+    
+    # 제곱거리로 상위 K개 선택, 선택된 K개만 sqrt
+    diff = st.ap_mat - q
+    d2 = np.einsum('ij,ij->i', diff, diff)
+    m = len(d2)
+    k = min(k, m)
+    idx = np.argpartition(d2, k - 1)[:k] if k < m else np.arange(m)
+    idx = idx[np.argsort(d2[idx], kind='stable')]
+    dist = np.sqrt(d2[idx].astype(np.float64))
+    
+    # 1/거리 가중 투표 (거리 0이면 그 위치로 확정)
+    weights = 1.0 / np.maximum(dist, 1e-6)
+    votes = defaultdict(float)
+    top_k = []
+    for d, i, w in zip(dist.tolist(), idx.tolist(), weights.tolist()):
+        location = st.locs[st.ap_rows[i]]
+        votes[location] += w
+        top_k.append({"location": location, "distance": d, "weight": w})
+    
+    best = max(votes, key=votes.get)
+    
+    # 신뢰도: AP당 RMS 차이 (dB)로 환산해 기존 KNN 기준 적용
+    confidence = float(knn_confidence(dist[0] / math.sqrt(len(q))))
+    
+    return best, confidence, top_k
+
+def _on_disk(fp):
+    """저장용 Fingerprint (raw_patterns 제외)"""
+    if KEEP_RAW_PATTERNS:
+        return fp
+    return {k: v for k, v in fp.items() if k != "raw_patterns"}
+
+_log_count = 0  # DB_LOG_FILE에 쌓인 추가분 수
+
+def get_db():
+    """Fingerprint DB (첫 호출 시 로드, 이후 같은 dict 반환)"""
+    if not _db_loaded:
+        with _DB_WRITE_LOCK:
+            if not _db_loaded:  # 잠금을 기다리는 동안 다른 스레드가 로드했을 수 있음
+                load_db()
+    return fingerprint_db
+
 def load_db():
     """Fingerprint DB 로드"""
-    global fingerprint_db
+    global _log_count, _db_loaded
     
-    if os.path.exists(DB_FILE):
-        try:
-            with open(DB_FILE, 'r', encoding='utf-8') as f:
-                fingerprint_db = json.load(f)
+    with _DB_WRITE_LOCK:
+        # 다른 모듈이 import한 fingerprint_db 참조가 유지되도록 제자리 갱신
+        if os.path.exists(DB_FILE):
+            try:
+                with open(DB_FILE, 'rb') as f:
+                    data = orjson.loads(f.read())
+                fingerprint_db.clear()
+                fingerprint_db.update(data)
+            except:
+                fingerprint_db.clear()
+        
+        # 병합 전 추가분 반영
+        _log_count = 0
+        if os.path.exists(DB_LOG_FILE):
+            with open(DB_LOG_FILE, 'rb') as f:
+                for line in f:
+                    try:
+                        location, fp = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue  # 기록 도중 끊긴 줄
+                    fingerprint_db[location] = fp
+                    _log_count += 1
+        
+        # 구버전 DB: raw_patterns가 남아 있으면 히스토그램으로 변환
+        for fp in fingerprint_db.values():
+            if "hist" not in fp and fp.get("raw_patterns"):
+                fp["hist"] = pattern_hist(fp["raw_patterns"])
+        
+        if fingerprint_db:
             print(f"✅ DB 로드: {len(fingerprint_db)}개 위치")
-        except:
-            fingerprint_db = {}
-    
-    return fingerprint_db
+        
+        if not _load_matrix():
+            _rebuild_matrix()
+        _db_loaded = True
+        return fingerprint_db
 
 def save_db():
-    """Fingerprint DB 저장"""
-    os.makedirs("logs", exist_ok=True)
+    """Fingerprint DB 저장 (전체 다시 쓰기 + 추가분 로그 비우기)"""
+    global _log_count
     
-    with open(DB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(fingerprint_db, f, indent=2, ensure_ascii=False)
-    
-    print(f"✅ DB 저장: {len(fingerprint_db)}개 위치")
+    with _DB_WRITE_LOCK:
+        get_db()
+        os.makedirs("logs", exist_ok=True)
+        
+        data = {loc: _on_disk(fp) for loc, fp in fingerprint_db.items()}
+        with open(DB_FILE, 'wb') as f:
+            f.write(orjson.dumps(data))
+        
+        if os.path.exists(DB_LOG_FILE):
+            os.remove(DB_LOG_FILE)
+        _log_count = 0
+        
+        _rebuild_matrix()
+        _save_matrix()
+        print(f"✅ DB 저장: {len(fingerprint_db)}개 위치")
 
 def add_fingerprint(location, fingerprint):
-    """DB에 Fingerprint 추가"""
-    fingerprint_db[location] = fingerprint
-    save_db()
+    """DB에 Fingerprint 추가 (추가분 로그에 한 줄 기록, 주기적으로 병합)"""
+    global _log_count
+    
+    with _DB_WRITE_LOCK:
+        get_db()[location] = fingerprint
+        
+        if _log_count + 1 >= DB_LOG_COMPACT:
+            save_db()
+            return
+        
+        os.makedirs("logs", exist_ok=True)
+        with open(DB_LOG_FILE, 'ab') as f:
+            f.write(orjson.dumps([location, _on_disk(fingerprint)]) + b"\n")
+        _log_count += 1
+        
+        _append_matrix(location)
+        _save_matrix()
+        print(f"✅ DB 추가: {location} ({len(fingerprint_db)}개 위치)")
 
 def get_db_stats():
     """DB 통계"""
-    if not fingerprint_db:
+    if not get_db():
         return {"count": 0, "locations": []}
     
     return {
@@ -205,9 +763,6 @@ def get_db_stats():
         "total_samples": sum(fp.get("samples", 0) for fp in fingerprint_db.values())
     }
 
-# 초기화 시 DB 로드
-load_db()
-
 # ============================================================
 # 테스트
 # ============================================================
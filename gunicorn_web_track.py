@@ -0,0 +1,16 @@
+"""
+gunicorn 설정 (web_track.py 운영 서버)
+실행: gunicorn -c gunicorn_web_track.py
+"""
+
+wsgi_app = "web_track:create_app()"
+bind = "0.0.0.0:5001"
+
+# 궤적/평활화 상태가 프로세스 전역이므로 워커는 1개 (WiFi 인터페이스도 하나)
+# 동시 요청은 스레드로 처리 (/api/status는 스캔 스레드의 스냅샷만 읽음, SSE 연결은 스레드 하나씩 점유)
+workers = 1
+worker_class = "gthread"
+threads = 8
+
+# 워커 프로세스 안에서 create_app() 실행 → 백그라운드 스캔은 한 번만 시작
+preload_app = False
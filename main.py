@@ -6,10 +6,19 @@ Aruba AP 기반 실내 위치 추적 시스템
 
 import sys
 import time
-import json
+import queue
+import logging
 import argparse
+import threading
+from heapq import nlargest
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import orjson
+import matplotlib
+matplotlib.use('Agg')  # 맵 PNG를 작업 스레드에서 저장 (GUI 백엔드 불필요)
+
 from config import ARUBA_APS, print_ap_info
 from ble_scanner import ArubaBLEScanner, SimulatedScanner
 from position_estimator import PositionEstimator
@@ -45,27 +54,51 @@ def run_console_mode(simulation: bool = True, duration: int = 60):
     print(f"\n⏱️ {duration}초 동안 위치 추적 시작...")
     print("   (Ctrl+C로 중지)\n")
     
-    start_time = time.time()
-    scan_count = 0
+    # 스캔 스레드 → 결과 큐 → 메인 스레드(추정/출력)
+    results = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    scan_count = 0  # 메인 스레드가 받아서 추정한 스캔 수
     
-    try:
-        while time.time() - start_time < duration:
-            scan_count += 1
-            print(f"\n[스캔 #{scan_count}] {datetime.now().strftime('%H:%M:%S')}")
+    def scan_worker():
+        n = 0
+        while not stop.is_set():
+            n += 1
             
             # 시뮬레이션 모드에서는 랜덤 이동
             if simulation:
                 import random
-                x = 10 + (scan_count * 3) % 60
+                x = 10 + (n * 3) % 60
                 y = 5 + random.uniform(-1.5, 1.5)
                 scanner.set_position(x, y)
             
-            # RSSI 스캔
-            rssi_result = scanner.scan_sync(duration=1.5)
+            # RSSI 스캔 (큐가 차 있으면 중지 신호를 확인하며 대기)
+            item = (n, datetime.now(), scanner.scan_sync(duration=1.5))
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            
+            stop.wait(1)
+    
+    scan_thread = threading.Thread(target=scan_worker, daemon=True)
+    start_time = time.time()
+    scan_thread.start()
+    
+    try:
+        while time.time() - start_time < duration:
+            try:
+                count, scanned_at, rssi_result = results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            scan_count += 1
+            
+            print(f"\n[스캔 #{count}] {scanned_at.strftime('%H:%M:%S')}")
             
             # RSSI 출력
             print("  📶 RSSI 값:")
-            for ap, rssi in sorted(rssi_result.items(), key=lambda x: x[1], reverse=True):
+            for ap, rssi in nlargest(len(rssi_result), rssi_result.items(), key=itemgetter(1)):
                 bar = "█" * max(0, int((rssi + 100) / 5))
                 print(f"     {ap}: {rssi:.1f} dBm {bar}")
             
@@ -83,10 +116,13 @@ def run_console_mode(simulation: bool = True, duration: int = 60):
             else:
                 print("\n  ⚠️ 위치 추정 실패")
             
-            time.sleep(1)
-            
     except KeyboardInterrupt:
         print("\n\n⏹️ 사용자에 의해 중지됨")
+    finally:
+        # 진행 중인 스캔이 끝날 때까지 기다린 뒤 스캐너 정리 (실행 중인 루프를 닫지 않도록)
+        stop.set()
+        scan_thread.join()
+        scanner.close()
     
     # 결과 저장
     print(f"\n📊 결과 요약:")
@@ -94,22 +130,27 @@ def run_console_mode(simulation: bool = True, duration: int = 60):
     print(f"   - 궤적 포인트: {len(trajectory)}개")
     
     if trajectory:
-        # JSON 저장
-        output_file = f"logs/trajectory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": datetime.now().isoformat(),
-                "simulation": simulation,
-                "scan_count": scan_count,
-                "trajectory": trajectory
-            }, f, indent=2, ensure_ascii=False)
-        print(f"   - 궤적 데이터 저장: {output_file}")
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
-        # 맵 생성
-        trajectory_points = [(p["x"], p["y"]) for p in trajectory]
-        map_file = f"logs/trajectory_map_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        create_static_map(trajectory_points, map_file)
-        print(f"   - 궤적 맵 저장: {map_file}")
+        # 맵 PNG는 별도 스레드에서 생성, 그동안 JSON 저장
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            trajectory_points = [(p["x"], p["y"]) for p in trajectory]
+            map_file = f"logs/trajectory_map_{stamp}.png"
+            map_future = executor.submit(create_static_map, trajectory_points, map_file)
+            
+            # JSON 저장
+            output_file = f"logs/trajectory_{stamp}.json"
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps({
+                    "timestamp": datetime.now().isoformat(),
+                    "simulation": simulation,
+                    "scan_count": scan_count,
+                    "trajectory": trajectory
+                }, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            print(f"   - 궤적 데이터 저장: {output_file}")
+            
+            map_future.result()
+            print(f"   - 궤적 맵 저장: {map_file}")
 
 
 def run_web_mode():
@@ -120,14 +161,10 @@ def run_web_mode():
     print("\n웹 서버를 시작합니다...")
     
     # app.py 실행
-    from app import app, init_scanner, background_scan
-    import threading
+    from app import create_app
     
-    init_scanner()
-    
-    # 백그라운드 스캔 스레드
-    scan_thread = threading.Thread(target=background_scan, daemon=True)
-    scan_thread.start()
+    # 스캐너 초기화 + 백그라운드 스캔
+    app = create_app()
     
     print("\n📡 서버 주소: http://localhost:5000")
     print("   브라우저에서 위 주소로 접속하세요.")
@@ -209,6 +246,8 @@ def main():
     
     args = parser.parse_args()
     
+    logging.basicConfig(level=logging.INFO)
+    
     # 실제 모드 옵션
     simulation = not args.real
     
@@ -4,21 +4,26 @@
 7415 원점 기준 좌표계 사용
 """
 
-import json
+import mmap
 import time
 import os
+import threading
 from datetime import datetime
 from typing import List, Tuple, Optional, Dict
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.collections import PatchCollection
 import numpy as np
+import orjson
 from config import (
     ARUBA_APS, AP_POSITIONS, MAP_BOUNDS, MAP_SCALE, 
     LOG_FILE, TRAJECTORY_FILE, ROOM_DATA, CORRIDORS
 )
 
 
+TRAJECTORY_CAPACITY = 8192  # 화면에 유지할 최대 궤적 포인트 수
+
+
 class MapVisualizer:
     """
     실내 맵 시각화 클래스
@@ -37,16 +42,35 @@ class MapVisualizer:
         self.fig = None
         self.ax = None
         
-        # 궤적 데이터
-        self.trajectory: List[Tuple[float, float, float]] = []  # (x, y, timestamp)
+        # 궤적 데이터: (x, y, timestamp) 행, 미리 할당한 2배 크기 버퍼
+        # 가득 차면 최근 CAPACITY개를 앞으로 옮겨 항상 연속된 뷰로 읽음
+        self._traj = np.empty((2 * TRAJECTORY_CAPACITY, 3), dtype=np.float64)
+        self._n = 0
         
         # 현재 위치
         self.current_position: Optional[Tuple[float, float]] = None
         
-        # 그래픽 요소
+        # 그래픽 요소 (setup_map에서 한 번 생성 후 set_data로 갱신)
         self.position_marker = None
         self.trajectory_line = None
+        self._start_marker = None
+        self._mid_points = None
+        
+        # 블리팅용 정적 배경 (호실/AP)
+        self._bg = None
         
+    @property
+    def trajectory(self) -> np.ndarray:
+        """최근 궤적 (N, 3) 뷰: x, y, timestamp"""
+        return self._traj[max(0, self._n - TRAJECTORY_CAPACITY):self._n]
+    
+    def _append_point(self, x: float, y: float, timestamp: float):
+        if self._n == len(self._traj):
+            self._traj[:TRAJECTORY_CAPACITY] = self._traj[-TRAJECTORY_CAPACITY:]
+            self._n = TRAJECTORY_CAPACITY
+        self._traj[self._n] = (x, y, timestamp)
+        self._n += 1
+    
     def setup_map(self, show_rooms: bool = True):
         """맵 초기 설정"""
         self.fig, self.ax = plt.subplots(figsize=self.figsize)
@@ -77,7 +101,49 @@ class MapVisualizer:
         self._add_legend()
         
         self.ax.set_aspect('equal')
+        
+        # 동적 요소 (animated: 정적 배경에서 제외, 블리팅으로만 그림)
+        self._mid_points, = self.ax.plot([], [], '.', markersize=6, color='lightblue',
+                                         alpha=0.6, zorder=7, animated=True)
+        self.trajectory_line, = self.ax.plot([], [], 'b-', linewidth=2.5, alpha=0.7,
+                                             zorder=8, animated=True)
+        self._start_marker, = self.ax.plot([], [], 's', markersize=10, color='green',
+                                           markeredgecolor='darkgreen', markeredgewidth=2,
+                                           zorder=9, animated=True)
+        self.position_marker, = self.ax.plot([], [], 'o', markersize=16, color='lime',
+                                             markeredgecolor='darkgreen', markeredgewidth=3,
+                                             zorder=10, animated=True)
+        
         plt.tight_layout()
+        
+        # 전체 다시 그릴 때마다 배경 갱신 (리사이즈 등)
+        self._saving = False
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.fig.canvas.draw()
+    
+    def _dynamic_artists(self):
+        return (self._mid_points, self.trajectory_line, self._start_marker, self.position_marker)
+    
+    def _on_draw(self, event):
+        """정적 배경 저장 후 동적 요소 그리기"""
+        canvas = self.fig.canvas
+        if not canvas.supports_blit or self._saving:
+            return  # savefig는 다른 dpi로 그리므로 배경으로 쓰지 않음
+        self._bg = canvas.copy_from_bbox(self.ax.bbox)
+        for artist in self._dynamic_artists():
+            self.ax.draw_artist(artist)
+    
+    def _blit(self):
+        """배경 복원 + 동적 요소만 다시 그리기"""
+        canvas = self.fig.canvas
+        if self._bg is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self._bg)
+        for artist in self._dynamic_artists():
+            self.ax.draw_artist(artist)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
     
     def _draw_rooms(self):
         """호실 폴리곤 그리기"""
@@ -87,42 +153,43 @@ class MapVisualizer:
         # 색상 맵
         colors = plt.cm.tab20.colors
         
+        polys, rgb, labels = [], [], []
         for i, room in enumerate(ROOM_DATA["rooms"]):
             room_num = room["room"]
             polygon = room.get("polygon_m", [])
-            centroid = room.get("centroid_m", [0, 0])
             
             if not polygon or len(polygon) < 3:
                 continue
             
-            # 폴리곤 좌표
-            xs = [p[0] for p in polygon]
-            ys = [p[1] for p in polygon]
+            polys.append(patches.Polygon(polygon, closed=True))
+            rgb.append(colors[i % len(colors)][:3])
             
-            # 색상 선택
-            color = colors[i % len(colors)]
-            
-            # 폴리곤 그리기
-            poly = patches.Polygon(
-                list(zip(xs, ys)),
-                closed=True,
-                fill=True,
-                facecolor=(*color[:3], 0.3),
-                edgecolor=(*color[:3], 0.8),
-                linewidth=1.5
-            )
-            self.ax.add_patch(poly)
-            
-            # 호실 번호 표시 (중심점에)
-            cx, cy = centroid
             # 7400번대 호실만 라벨 표시 (너무 많으면 복잡해짐)
             if room_num.startswith("74"):
-                self.ax.text(
-                    cx, cy, room_num,
-                    ha='center', va='center',
-                    fontsize=8, fontweight='bold',
-                    color='black', alpha=0.8
-                )
+                labels.append((room.get("centroid_m", [0, 0]), room_num))
+        
+        if not polys:
+            return
+        
+        # 폴리곤 한 번에 그리기
+        rgb = np.asarray(rgb)
+        coll = PatchCollection(
+            polys,
+            facecolors=np.column_stack([rgb, np.full(len(rgb), 0.3)]),
+            edgecolors=np.column_stack([rgb, np.full(len(rgb), 0.8)]),
+            linewidths=1.5
+        )
+        self.ax.add_collection(coll, autolim=False)
+        
+        # 호실 번호 표시 (중심점에), 축 범위 재계산 생략
+        self.ax.set_autoscale_on(False)
+        for (cx, cy), room_num in labels:
+            self.ax.text(
+                cx, cy, room_num,
+                ha='center', va='center',
+                fontsize=8, fontweight='bold',
+                color='black', alpha=0.8
+            )
     
     def _draw_corridors(self):
         """복도 영역 그리기 (호실 데이터 없을 때)"""
@@ -189,13 +256,13 @@ class MapVisualizer:
     
     def _add_legend(self):
         """범례 추가"""
-        legend_elements = [
+        self.legend_elements = [
             plt.scatter([], [], marker='^', s=100, c='red', label='AP 위치'),
             plt.scatter([], [], marker='o', s=150, c='lime', label='현재 위치'),
             plt.Line2D([0], [0], color='blue', linewidth=2, alpha=0.7, label='이동 궤적'),
             plt.scatter([], [], marker='s', s=80, c='green', label='시작점')
         ]
-        self.ax.legend(handles=legend_elements, loc='upper right')
+        self.ax.legend(handles=self.legend_elements, loc='upper right')
     
     def update_position(self, x: float, y: float, timestamp: Optional[float] = None):
         """
@@ -209,46 +276,29 @@ class MapVisualizer:
             timestamp = time.time()
             
         self.current_position = (x, y)
-        self.trajectory.append((x, y, timestamp))
-        
-        # 이전 마커 제거
-        if self.position_marker:
-            self.position_marker.remove()
-        
-        # 새 마커 그리기
-        self.position_marker = self.ax.scatter(
-            x, y, marker='o', s=250, c='lime',
-            edgecolors='darkgreen', linewidths=3, zorder=10
-        )
+        self._append_point(x, y, timestamp)
         
-        # 궤적 업데이트
+        # 마커/궤적 데이터만 갱신
+        self.position_marker.set_data([x], [y])
         self._update_trajectory()
+        self._blit()
         
     def _update_trajectory(self):
         """궤적 라인 업데이트"""
-        if len(self.trajectory) < 2:
+        traj = self.trajectory
+        if len(traj) < 2:
             return
-            
-        # 이전 궤적 제거
-        if self.trajectory_line:
-            self.trajectory_line.remove()
         
-        # 새 궤적 그리기
-        xs = [p[0] for p in self.trajectory]
-        ys = [p[1] for p in self.trajectory]
+        xs = traj[:, 0]
+        ys = traj[:, 1]
         
-        self.trajectory_line, = self.ax.plot(
-            xs, ys, 'b-', linewidth=2.5, alpha=0.7, zorder=8
-        )
+        self.trajectory_line.set_data(xs, ys)
         
         # 시작점
-        self.ax.scatter(xs[0], ys[0], marker='s', s=100, c='green',
-                       edgecolors='darkgreen', linewidths=2, zorder=9)
+        self._start_marker.set_data(xs[:1], ys[:1])
         
         # 궤적 점들도 표시
-        if len(xs) > 2:
-            self.ax.scatter(xs[1:-1], ys[1:-1], marker='.', s=40, 
-                           c='lightblue', alpha=0.6, zorder=7)
+        self._mid_points.set_data(xs[1:-1], ys[1:-1])
     
     def show(self):
         """맵 표시"""
@@ -256,7 +306,20 @@ class MapVisualizer:
         
     def save(self, filename: str = "trajectory_map.png"):
         """맵 저장"""
-        self.fig.savefig(filename, dpi=150, bbox_inches='tight')
+        # savefig는 animated 요소를 건너뛰므로 저장 동안만 해제
+        artists = [a for a in self._dynamic_artists() if a is not None]
+        for artist in artists:
+            artist.set_animated(False)
+        self._saving = True
+        try:
+            self.fig.savefig(filename, dpi=150, bbox_inches='tight')
+        finally:
+            self._saving = False
+            for artist in artists:
+                artist.set_animated(True)
+        # 저장용 렌더러가 남으므로 화면 배경 다시 그리기
+        self._bg = None
+        self.fig.canvas.draw_idle()
         print(f"💾 맵 저장됨: {filename}")
         
     def save_trajectory(self, filename: str = None):
@@ -270,12 +333,12 @@ class MapVisualizer:
             "ap_count": len(ARUBA_APS),
             "trajectory": [
                 {"x": x, "y": y, "time": t}
-                for x, y, t in self.trajectory
+                for x, y, t in self.trajectory.tolist()
             ]
         }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
         
         print(f"💾 궤적 데이터 저장됨: {filename}")
     
@@ -285,13 +348,15 @@ class MapVisualizer:
             filename = TRAJECTORY_FILE
             
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 큰 파일도 복사 없이 파싱
+            with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                data = orjson.loads(memoryview(m))
             
-            self.trajectory = [
-                (p["x"], p["y"], p["time"])
-                for p in data["trajectory"]
-            ]
+            rows = np.array(
+                [(p["x"], p["y"], p["time"]) for p in data["trajectory"]], dtype=np.float64
+            ).reshape(-1, 3)[-TRAJECTORY_CAPACITY:]
+            self._traj[:len(rows)] = rows
+            self._n = len(rows)
             
             print(f"📂 궤적 데이터 로드됨: {len(self.trajectory)}개 포인트")
             return True
@@ -301,11 +366,27 @@ class MapVisualizer:
     
     def clear_trajectory(self):
         """궤적 초기화"""
-        self.trajectory = []
+        self._n = 0
         self.current_position = None
         if self.trajectory_line:
-            self.trajectory_line.remove()
-            self.trajectory_line = None
+            for artist in self._dynamic_artists():
+                artist.set_data([], [])
+            self._blit()
+
+
+# 정적 맵 배경 (show_rooms별로 한 번만 그림)
+_BASE_VIS: Dict[bool, MapVisualizer] = {}
+_BASE_LOCK = threading.Lock()
+
+
+def _base_visualizer(show_rooms: bool) -> MapVisualizer:
+    """호실/AP가 그려진 공용 맵 (처음 호출 시 생성)"""
+    visualizer = _BASE_VIS.get(show_rooms)
+    if visualizer is None:
+        visualizer = MapVisualizer()
+        visualizer.setup_map(show_rooms=show_rooms)
+        _BASE_VIS[show_rooms] = visualizer
+    return visualizer
 
 
 def create_static_map(trajectory_data: List[Tuple[float, float]], 
@@ -313,45 +394,59 @@ def create_static_map(trajectory_data: List[Tuple[float, float]],
                       show_rooms: bool = True):
     """
     정적 궤적 맵 생성
+    공용 배경 맵에 궤적만 잠시 겹쳐 그려 저장 (호출마다 맵을 새로 그리지 않음)
     
     Args:
         trajectory_data: [(x, y), ...] 궤적 데이터
         output_file: 출력 파일명
         show_rooms: 호실 표시 여부
-    """
-    visualizer = MapVisualizer()
-    visualizer.setup_map(show_rooms=show_rooms)
     
-    # 궤적 그리기
-    if len(trajectory_data) > 0:
-        xs = [p[0] for p in trajectory_data]
-        ys = [p[1] for p in trajectory_data]
+    Returns:
+        저장된 파일 경로 (공용 배경 맵 객체는 반환하지 않음)
+    """
+    with _BASE_LOCK:
+        visualizer = _base_visualizer(show_rooms)
+        ax = visualizer.ax
+        overlay = []
+        
+        # 궤적 그리기
+        if len(trajectory_data) > 0:
+            xs = [p[0] for p in trajectory_data]
+            ys = [p[1] for p in trajectory_data]
+            
+            # 궤적 라인
+            overlay += ax.plot(xs, ys, 'b-', linewidth=2.5, alpha=0.7, label='이동 경로')
+            
+            # 시작점
+            overlay.append(ax.scatter(xs[0], ys[0], marker='s', s=150, c='green',
+                                      edgecolors='darkgreen', linewidths=2, 
+                                      zorder=10, label='시작점'))
+            
+            # 끝점
+            overlay.append(ax.scatter(xs[-1], ys[-1], marker='o', s=200, c='lime',
+                                      edgecolors='darkgreen', linewidths=2,
+                                      zorder=10, label='현재 위치'))
+            
+            # 중간 점들
+            if len(xs) > 2:
+                overlay.append(ax.scatter(xs[1:-1], ys[1:-1], marker='.', s=40, 
+                                          c='lightblue', alpha=0.5, zorder=8))
         
-        # 궤적 라인
-        visualizer.ax.plot(xs, ys, 'b-', linewidth=2.5, alpha=0.7, label='이동 경로')
+        ax.legend(loc='upper right')
         
-        # 시작점
-        visualizer.ax.scatter(xs[0], ys[0], marker='s', s=150, c='green',
-                            edgecolors='darkgreen', linewidths=2, 
-                            zorder=10, label='시작점')
-        
-        # 끝점
-        visualizer.ax.scatter(xs[-1], ys[-1], marker='o', s=200, c='lime',
-                            edgecolors='darkgreen', linewidths=2,
-                            zorder=10, label='현재 위치')
-        
-        # 중간 점들
-        if len(xs) > 2:
-            visualizer.ax.scatter(xs[1:-1], ys[1:-1], marker='.', s=40, 
-                                c='lightblue', alpha=0.5, zorder=8)
-    
-    visualizer.ax.legend(loc='upper right')
-    
-    # 디렉토리 생성
-    os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else ".", exist_ok=True)
-    visualizer.save(output_file)
+        # 디렉토리 생성
+        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else ".", exist_ok=True)
+        
+        try:
+            visualizer.fig.savefig(output_file, dpi=150, bbox_inches='tight')
+        finally:
+            # 배경 맵 원상 복구
+            for artist in overlay:
+                artist.remove()
+            ax.legend(handles=visualizer.legend_elements, loc='upper right')
+        print(f"💾 맵 저장됨: {output_file}")
     
-    return visualizer
+    return output_file
 
 
 if __name__ == "__main__":
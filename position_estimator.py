@@ -4,15 +4,131 @@
 """
 
 import math
+from array import array
 import numpy as np
-from typing import Dict, List, Tuple, Optional
-from scipy.optimize import minimize
+from typing import Dict, Tuple, Optional
+from scipy.optimize import least_squares
 from config import (
-    ARUBA_APS, AP_POSITIONS, rssi_to_distance,
+    ARUBA_APS, AP_NAMES_ARR, AP_POSITIONS_ARR, AP_INDEX, rssi_to_distance, rssi_to_distance_vec,
+    RSSI_MIN,
     MIN_AP_FOR_TRILATERATION, MAX_DISTANCE,
     MAP_BOUNDS
 )
 
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    # Numba 미설치 시 순수 Python으로 실행
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+# 삼변측량 선형계의 최소/최대 특이값 비 하한 (이보다 작으면 AP 배치가 일직선에 가까움)
+TRILAT_MIN_COND = 0.1
+# 삼변측량 해의 거리 잔차 RMS 상한 (m), 넘거나 맵 밖이면 해를 버리고 가중 중심
+TRILAT_MAX_RMS = 4.0
+
+# 맵 경계 (x, y) 하한/상한
+_BOUND_LO = np.array([MAP_BOUNDS["min_x"], MAP_BOUNDS["min_y"]], dtype=np.float64)
+_BOUND_HI = np.array([MAP_BOUNDS["max_x"], MAP_BOUNDS["max_y"]], dtype=np.float64)
+
+# 최소제곱 종료 조건 (상대 허용오차, 최대 함수 평가 횟수)
+LSQ_OPTIONS = {"xtol": 1e-3, "ftol": 1e-4, "max_nfev": 50}
+
+
+@njit(cache=True, fastmath=True)
+def _wcentroid(pos, dist, g):
+    """
+    가중 중심 커널 (Numba JIT)
+    
+    Args:
+        pos: AP 좌표 배열 (N, 2) float64
+        dist: AP별 추정 거리 배열 (N,) float64
+        g: 거리 가중 지수 (weight = 1 / dist**g)
+        
+    Returns:
+        (가중 x 합, 가중 y 합, 가중치 합)
+    """
+    sx = 0.0
+    sy = 0.0
+    s = 0.0
+    for i in range(dist.shape[0]):
+        if dist[i] > 0:
+            w = 1.0 / dist[i] ** g
+            sx += pos[i, 0] * w
+            sy += pos[i, 1] * w
+            s += w
+    return sx, sy, s
+
+
+@njit(cache=True, fastmath=True)
+def _lsq_residuals(pos, P, d):
+    """
+    최소제곱 잔차 커널 (Numba JIT): AP별 (추정 거리 - 측정 거리)
+    
+    Args:
+        pos: 현재 위치 (2,)
+        P: AP 좌표 배열 (N, 2) float64
+        d: AP별 측정 거리 (N,) float64
+    """
+    n = P.shape[0]
+    r = np.empty(n)
+    for i in range(n):
+        dx = pos[0] - P[i, 0]
+        dy = pos[1] - P[i, 1]
+        r[i] = math.sqrt(dx * dx + dy * dy) - d[i]
+    return r
+
+
+@njit(cache=True, fastmath=True)
+def _lsq_jacobian(pos, P, d):
+    """최소제곱 야코비안 커널 (Numba JIT): 각 AP에서 현재 위치 방향의 단위 벡터 (N, 2)"""
+    n = P.shape[0]
+    J = np.empty((n, 2))
+    for i in range(n):
+        dx = pos[0] - P[i, 0]
+        dy = pos[1] - P[i, 1]
+        norm = max(math.sqrt(dx * dx + dy * dy), 1e-9)
+        J[i, 0] = dx / norm
+        J[i, 1] = dy / norm
+    return J
+
+
+def _lsq_residuals_np(pos, P, d):
+    """최소제곱 잔차 (NumPy 벡터 연산, Numba 미설치 시 Python 루프 대신 사용)"""
+    diff = P - pos
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff)) - d
+
+
+def _lsq_jacobian_np(pos, P, d):
+    """최소제곱 야코비안 (NumPy 벡터 연산, Numba 미설치 시 사용)"""
+    diff = pos - P
+    norm = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+    return diff / np.maximum(norm, 1e-9)[:, None]
+
+
+# 최소제곱 콜백: JIT 커널, Numba가 없으면 NumPy 버전
+if HAVE_NUMBA:
+    _LSQ_FUN, _LSQ_JAC = _lsq_residuals, _lsq_jacobian
+else:
+    _LSQ_FUN, _LSQ_JAC = _lsq_residuals_np, _lsq_jacobian_np
+
+
+def clip_to_map(xy):
+    """좌표 (2,) 또는 (N, 2) 배열을 맵 경계 내로 제한"""
+    return np.clip(np.asarray(xy, dtype=np.float64), _BOUND_LO, _BOUND_HI)
+
+
+def warmup():
+    """JIT 커널 미리 컴파일 (첫 스캔 지연 방지)"""
+    _wcentroid(np.zeros((1, 2), dtype=np.float64), np.ones(1, dtype=np.float64), 2.0)
+    _lsq_residuals(np.zeros(2), np.ones((1, 2)), np.ones(1))
+    _lsq_jacobian(np.zeros(2), np.ones((1, 2)), np.ones(1))
+
 
 class PositionEstimator:
     """
@@ -30,7 +146,14 @@ class PositionEstimator:
         """
         self.method = method
         self.last_position: Optional[Tuple[float, float]] = None
-        self.position_history: List[Tuple[float, float, float]] = []  # (x, y, timestamp)
+        # AP 좌표/인덱스 (매 estimate마다 다시 만들지 않도록 보관)
+        self._ap_names = AP_NAMES_ARR
+        self._ap_xy = AP_POSITIONS_ARR.astype(np.float64)
+        self._ap_idx = AP_INDEX
+        # 위치 히스토리 (x, y, timestamp 열 분리, C double 배열)
+        self._xs = array('d')
+        self._ys = array('d')
+        self._ts = array('d')
         
     def estimate(self, rssi_dict: Dict[str, float]) -> Optional[Tuple[float, float]]:
         """
@@ -42,143 +165,138 @@ class PositionEstimator:
         Returns:
             (x, y) 좌표 또는 None
         """
-        # RSSI를 거리로 변환
-        distances = {}
+        # 알려진 AP의 RSSI만 배열에 채우기 (미감지 AP는 NaN)
+        # 호출마다 새로 할당 (AP 수만큼의 작은 배열, 여러 스레드가 같은 estimator를 공유해도 안전)
+        rssi_arr = np.full(len(self._ap_names), np.nan)
         for ap_name, rssi in rssi_dict.items():
-            if rssi > -100 and ap_name in AP_POSITIONS:
-                dist = rssi_to_distance(rssi)
-                if dist < MAX_DISTANCE:
-                    distances[ap_name] = dist
+            i = self._ap_idx.get(ap_name)
+            if i is not None:
+                rssi_arr[i] = rssi
+        
+        # RSSI → 거리 한 번에 변환 (정수 dBm으로 반올림해 룩업, 노이즈 대비 오차 무시 가능)
+        d_arr = rssi_to_distance_vec(rssi_arr)
+        mask = (rssi_arr > RSSI_MIN) & (d_arr < MAX_DISTANCE)
+        
+        idx = np.flatnonzero(mask)
         
         # 충분한 AP가 감지되지 않으면 None 반환
-        if len(distances) < MIN_AP_FOR_TRILATERATION:
-            print(f"⚠️ 감지된 AP 부족: {len(distances)}개 (최소 {MIN_AP_FOR_TRILATERATION}개 필요)")
+        if len(idx) < MIN_AP_FOR_TRILATERATION:
+            print(f"⚠️ 감지된 AP 부족: {len(idx)}개 (최소 {MIN_AP_FOR_TRILATERATION}개 필요)")
             return self.last_position
         
-        # 위치 추정 방법 선택
+        # 위치 추정 방법 선택 (감지된 AP의 행 인덱스와 거리 배열 전달)
+        dist = d_arr[idx]
         if self.method == "weighted_centroid":
-            position = self._weighted_centroid(distances)
+            position = self._weighted_centroid(idx, dist)
         elif self.method == "trilateration":
-            position = self._trilateration(distances)
+            position = self._trilateration(idx, dist)
         elif self.method == "least_squares":
-            position = self._least_squares(distances)
+            position = self._least_squares(idx, dist)
         else:
-            position = self._weighted_centroid(distances)
+            position = self._weighted_centroid(idx, dist)
         
         # 맵 경계 내로 제한
         if position:
-            x = max(MAP_BOUNDS["min_x"], min(position[0], MAP_BOUNDS["max_x"]))
-            y = max(MAP_BOUNDS["min_y"], min(position[1], MAP_BOUNDS["max_y"]))
-            position = (x, y)
+            position = tuple(clip_to_map(position).tolist())
             self.last_position = position
             
         return position
     
-    def _weighted_centroid(self, distances: Dict[str, float]) -> Tuple[float, float]:
+    def _weighted_centroid(self, idx: np.ndarray, dist: np.ndarray) -> Tuple[float, float]:
         """
         가중 중심법
         거리에 반비례하는 가중치로 위치 계산
+        
+        Args:
+            idx: 감지된 AP의 행 인덱스
+            dist: AP별 추정 거리 (idx와 같은 순서)
         """
-        total_weight = 0
-        weighted_x = 0
-        weighted_y = 0
-        
-        for ap_name, distance in distances.items():
-            if distance > 0:
-                # 거리에 반비례하는 가중치 (가까울수록 높은 가중치)
-                weight = 1 / (distance ** 2)
-                
-                ap_x, ap_y = AP_POSITIONS[ap_name]
-                weighted_x += ap_x * weight
-                weighted_y += ap_y * weight
-                total_weight += weight
+        # 거리에 반비례하는 가중치 (가까울수록 높은 가중치)
+        weighted_x, weighted_y, total_weight = _wcentroid(self._ap_xy[idx], dist, 2.0)
         
         if total_weight > 0:
             return (weighted_x / total_weight, weighted_y / total_weight)
         return None
     
-    def _trilateration(self, distances: Dict[str, float]) -> Optional[Tuple[float, float]]:
+    def _trilateration(self, idx: np.ndarray, dist: np.ndarray) -> Optional[Tuple[float, float]]:
         """
         삼변측량법
         3개 이상의 원의 교점을 계산
         """
-        # 가장 가까운 3개 AP 선택
-        sorted_aps = sorted(distances.items(), key=lambda x: x[1])[:3]
-        
-        if len(sorted_aps) < 3:
-            return self._weighted_centroid(distances)
-        
-        # 좌표 및 거리 추출
-        points = []
-        dists = []
-        for ap_name, dist in sorted_aps:
-            points.append(AP_POSITIONS[ap_name])
-            dists.append(dist)
-        
-        # 삼변측량 계산
-        try:
-            x1, y1 = points[0]
-            x2, y2 = points[1]
-            x3, y3 = points[2]
-            r1, r2, r3 = dists[0], dists[1], dists[2]
-            
-            # 선형화된 방정식 풀기
-            A = 2 * np.array([
-                [x2 - x1, y2 - y1],
-                [x3 - x1, y3 - y1]
-            ])
-            
-            b = np.array([
-                r1**2 - r2**2 - x1**2 + x2**2 - y1**2 + y2**2,
-                r1**2 - r3**2 - x1**2 + x3**2 - y1**2 + y3**2
-            ])
-            
-            # A가 특이행렬인지 확인
-            if np.linalg.det(A) == 0:
-                return self._weighted_centroid(distances)
-            
-            position = np.linalg.solve(A, b)
-            return (float(position[0]), float(position[1]))
-            
-        except Exception as e:
-            print(f"⚠️ 삼변측량 오류: {e}")
-            return self._weighted_centroid(distances)
+        if len(idx) < 3:
+            return self._weighted_centroid(idx, dist)
+        
+        # 모든 AP 사용, 가장 가까운 AP를 기준식으로 (Manolakis/Coope 선형화)
+        order = np.argsort(dist, kind='stable')
+        P, r = self._ap_xy[idx[order]], dist[order]
+        
+        # 기준식을 나머지 식에서 빼면 선형 연립방정식 A x = b (N-1개 식)
+        P0, Pi = P[0], P[1:]
+        A = 2 * (Pi - P0)
+        b = (r[0] ** 2 - r[1:] ** 2) - (P0 @ P0 - (Pi * Pi).sum(axis=1))
+        
+        position, _, rank, sv = np.linalg.lstsq(A, b, rcond=None)
+        
+        # AP가 (거의) 일직선이면 해가 불안정 → 가중 중심
+        if rank < 2 or sv[-1] < TRILAT_MIN_COND * sv[0]:
+            return self._weighted_centroid(idx, dist)
+        
+        # 조건수는 통과해도 한 축이 AP 한두 개에만 의존하면 해가 맵 밖으로 튐 → 가중 중심
+        if np.any(position < _BOUND_LO) or np.any(position > _BOUND_HI):
+            return self._weighted_centroid(idx, dist)
+        res = np.sqrt(((P - position) ** 2).sum(axis=1)) - r
+        if res @ res > TRILAT_MAX_RMS ** 2 * len(r):
+            return self._weighted_centroid(idx, dist)
+        
+        return (float(position[0]), float(position[1]))
     
-    def _least_squares(self, distances: Dict[str, float]) -> Tuple[float, float]:
+    def _least_squares(self, idx: np.ndarray, dist: np.ndarray) -> Tuple[float, float]:
         """
         최소제곱법
         모든 AP로부터의 거리 오차를 최소화하는 위치 찾기
         """
-        def objective(pos):
-            x, y = pos
-            total_error = 0
-            for ap_name, measured_dist in distances.items():
-                ap_x, ap_y = AP_POSITIONS[ap_name]
-                estimated_dist = math.sqrt((x - ap_x)**2 + (y - ap_y)**2)
-                total_error += (estimated_dist - measured_dist) ** 2
-            return total_error
+        # 잔차/야코비안 콜백 (AP 좌표와 측정 거리는 args로 전달)
+        args = (self._ap_xy[idx], dist)
         
         # 초기 추정값 (가중 중심)
-        initial = self._weighted_centroid(distances)
+        initial = self._weighted_centroid(idx, dist)
         if initial is None:
             initial = (MAP_BOUNDS["max_x"] / 2, MAP_BOUNDS["max_y"] / 2)
         
-        # 최적화
-        result = minimize(objective, initial, method='Nelder-Mead')
+        # 최적화 (Levenberg-Marquardt, AP가 일직선이라 평가 횟수 안에 수렴 못 하면 TRF로 재시도)
+        # 미터 단위 위치라 기본 허용오차(1e-8)까지 갈 필요 없음 → 조기 종료
+        x0 = np.asarray(initial, dtype=np.float64)
+        result = least_squares(_LSQ_FUN, x0, jac=_LSQ_JAC, args=args, method='lm', **LSQ_OPTIONS)
+        if not result.success:
+            result = least_squares(_LSQ_FUN, x0, jac=_LSQ_JAC, args=args, method='trf', **LSQ_OPTIONS)
         
         return (float(result.x[0]), float(result.x[1]))
     
     def add_to_history(self, x: float, y: float, timestamp: float):
         """위치 히스토리에 추가"""
-        self.position_history.append((x, y, timestamp))
+        self._xs.append(x)
+        self._ys.append(y)
+        self._ts.append(timestamp)
+    
+    @property
+    def position_history(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        위치 히스토리 열 (xs, ys, ts)
+        버퍼 뷰를 들고 있으면 array가 늘어나지 못하므로 복사본 반환 (memcpy 한 번)
+        """
+        return (np.array(self._xs, dtype=np.float64),
+                np.array(self._ys, dtype=np.float64),
+                np.array(self._ts, dtype=np.float64))
     
-    def get_trajectory(self) -> List[Tuple[float, float, float]]:
-        """궤적 데이터 반환"""
-        return self.position_history.copy()
+    def get_trajectory(self) -> np.ndarray:
+        """궤적 데이터 반환 (N, 3): x, y, timestamp"""
+        return np.column_stack(self.position_history)
     
     def clear_history(self):
         """히스토리 초기화"""
-        self.position_history = []
+        self._xs = array('d')
+        self._ys = array('d')
+        self._ts = array('d')
         self.last_position = None
 
 
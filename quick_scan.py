@@ -5,6 +5,7 @@
 """
 
 import asyncio
+from collections import Counter
 from bleak import BleakScanner
 
 # Aruba AP BLE MAC 주소 목록
@@ -17,25 +18,40 @@ ARUBA_BLE_MACS = {
     "3C:A3:08:08:73:6A": "AP-13 (인문2관)",
 }
 
+SCAN_TIMEOUT = 5.0   # 최대 스캔 시간 (초)
+MIN_HITS = 3         # AP별 이 횟수 이상 수신되면 조기 종료
+
 async def scan_all():
     """모든 BLE 기기 스캔"""
     print("=" * 60)
-    print("🔍 BLE 스캔 시작 (5초)...")
+    print(f"🔍 BLE 스캔 시작 (최대 {SCAN_TIMEOUT:.0f}초)...")
     print("=" * 60)
     
     # 콜백으로 RSSI 수집
     devices_dict = {}
+    hits = Counter()
+    done = asyncio.Event()
     
     def detection_callback(device, advertisement_data):
-        devices_dict[device.address.upper()] = {
+        mac = device.address.upper()
+        devices_dict[mac] = {
             "name": device.name or advertisement_data.local_name or "(이름 없음)",
             "rssi": advertisement_data.rssi,
             "device": device
         }
+        # 모든 Aruba AP가 충분히 잡히면 바로 종료
+        if mac in ARUBA_BLE_MACS:
+            hits[mac] += 1
+            if len(hits) == len(ARUBA_BLE_MACS) and min(hits.values()) >= MIN_HITS:
+                done.set()
     
-    scanner = BleakScanner(detection_callback=detection_callback)
+    # 액티브 스캔 (스캔 응답까지 받아 광고 패킷 수 증가)
+    scanner = BleakScanner(detection_callback=detection_callback, scanning_mode="active")
     await scanner.start()
-    await asyncio.sleep(5.0)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=SCAN_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
     await scanner.stop()
     
     print(f"\n📱 발견된 BLE 기기: {len(devices_dict)}개\n")
@@ -5,11 +5,14 @@
 복도를 따라 이동하면서 위치 기록
 """
 
+import sys
 import time
 import json
 import os
 from datetime import datetime
 
+import numpy as np
+
 try:
     from CoreWLAN import CWWiFiClient
     USE_WIFI = True
@@ -49,76 +52,85 @@ ROOM_POSITIONS = {
     "7401": 49.6,
 }
 
-def normalize_mac(mac):
-    if not mac:
-        return ""
-    mac = mac.upper().replace("-", ":").replace(".", ":")
-    mac_clean = mac.replace(":", "")
-    if len(mac_clean) == 12:
-        return ":".join(mac_clean[i:i+2] for i in range(0, 12, 2))
-    return mac
+# np.interp용 보간 테이블 (RSSI 오름차순)
+_CAL_RSSI = np.array([c[1] for c in reversed(CALIBRATION)], dtype=np.float64)
+_CAL_POS = np.array([c[2] for c in reversed(CALIBRATION)], dtype=np.float64)
+
+# 호실 위치 벡터 (get_nearest_room용)
+_ROOM_NAMES = tuple(ROOM_POSITIONS)
+_ROOM_POS = np.fromiter(ROOM_POSITIONS.values(), dtype=np.float64, count=len(ROOM_POSITIONS))
 
 def rssi_to_position(rssi):
     """RSSI → 7413 기준 위치 (미터)"""
-    rssi_list = [c[1] for c in CALIBRATION]
-    pos_list = [c[2] for c in CALIBRATION]
-    
-    if rssi >= rssi_list[0]:
-        return pos_list[0]
-    elif rssi <= rssi_list[-1]:
+    if rssi <= _CAL_RSSI[0]:
         # 외삽
-        return pos_list[-1] + (rssi_list[-1] - rssi) * 1.0
-    else:
-        # 선형 보간
-        for i in range(len(rssi_list) - 1):
-            if rssi_list[i] >= rssi >= rssi_list[i+1]:
-                ratio = (rssi_list[i] - rssi) / (rssi_list[i] - rssi_list[i+1])
-                return pos_list[i] + ratio * (pos_list[i+1] - pos_list[i])
-    return 0
+        return float(_CAL_POS[0] + (_CAL_RSSI[0] - rssi) * 1.0)
+    # 선형 보간 (최대 RSSI 이상은 원점으로 고정)
+    return float(np.interp(rssi, _CAL_RSSI, _CAL_POS))
 
 def get_nearest_room(pos):
     """위치에서 가장 가까운 호실"""
-    min_dist = float('inf')
-    nearest = "7413"
-    for room, room_pos in ROOM_POSITIONS.items():
-        dist = abs(pos - room_pos)
-        if dist < min_dist:
-            min_dist = dist
-            nearest = room
-    return nearest, min_dist
+    d = np.abs(_ROOM_POS - pos)
+    i = int(d.argmin())
+    return _ROOM_NAMES[i], float(d[i])
+
+# ASCII 궤적 화면 설정
+_TRACK_WIDTH = 60
+_TRACK_MAX_POS = 55  # 최대 위치 (미터)
+# 출력 시 ASCII 표시 문자 → 실제 기호
+_TRACK_GLYPHS = str.maketrans({".": "·", "#": "●"})
+
+def _track_col(pos):
+    """위치(미터) → 화면 열 인덱스 (범위 밖이면 -1)"""
+    idx = int(pos / _TRACK_MAX_POS * (_TRACK_WIDTH - 1))
+    return idx if 0 <= idx < _TRACK_WIDTH else -1
+
+# 복도 그리기 (호실 위치는 고정이므로 한 번만)
+_corridor = bytearray(b"-" * _TRACK_WIDTH)
+for _pos in ROOM_POSITIONS.values():
+    _col = _track_col(_pos)
+    if _col >= 0:
+        _corridor[_col] = ord("|")
+_CORRIDOR_LINE = _corridor.decode()
+del _corridor, _pos, _col
+
+# 궤적 줄 버퍼 (이전 호출 이후 새로 추가된 포인트만 찍음)
+_track_buf = bytearray(b" " * _TRACK_WIDTH)
+_track_drawn = 0
 
 def draw_track(trajectory, current_pos=None):
     """ASCII 아트로 궤적 표시"""
-    width = 60
-    max_pos = 55  # 최대 위치 (미터)
-    
-    # 복도 그리기
-    corridor = ['-'] * width
+    global _track_drawn
     
-    # 호실 위치 표시
-    for room, pos in ROOM_POSITIONS.items():
-        idx = int(pos / max_pos * (width - 1))
-        if 0 <= idx < width:
-            corridor[idx] = '|'
+    # 새 궤적이면 버퍼 초기화
+    if len(trajectory) < _track_drawn:
+        _track_buf[:] = b" " * _TRACK_WIDTH
+        _track_drawn = 0
     
-    # 궤적 표시
-    track_line = [' '] * width
-    for point in trajectory:
-        idx = int(point['position'] / max_pos * (width - 1))
-        if 0 <= idx < width:
-            track_line[idx] = '·'
+    # 궤적 표시 (새 포인트만)
+    for i in range(_track_drawn, len(trajectory)):
+        col = _track_col(trajectory[i]['position'])
+        if col >= 0:
+            _track_buf[col] = ord(".")
+    _track_drawn = len(trajectory)
     
-    # 현재 위치 표시
-    if current_pos is not None:
-        idx = int(current_pos / max_pos * (width - 1))
-        if 0 <= idx < width:
-            track_line[idx] = '●'
+    # 현재 위치 표시 (출력 후 원래 칸으로 복원)
+    col = _track_col(current_pos) if current_pos is not None else -1
+    if col >= 0:
+        prev = _track_buf[col]
+        _track_buf[col] = ord("#")
+    track_line = _track_buf.decode().translate(_TRACK_GLYPHS)
+    if col >= 0:
+        _track_buf[col] = prev
     
     # 출력
     print("\n" + "7413" + " " * 23 + "7408" + " " * 11 + "7405" + " " * 8 + "7401")
-    print(" " + "".join(corridor))
-    print(" " + "".join(track_line))
-    print(f" 0m{' ' * 24}~27m{' ' * 10}~38m{' ' * 8}~52m")
+    print(" " + _CORRIDOR_LINE)
+    print(" " + track_line)
+    print(f" 0m{' ' * 24}~27m{' ' * 10}~38m{' ' * 8}~52m", flush=True)
+
+# 추적 루프 상태 줄 (포맷 문자열은 한 번만 파싱)
+_STATUS_FMT = "\r[{t:5.1f}s] RSSI:{r:4d}dBm | 위치:{p:5.1f}m | {m} | {d} |{b}{nl}".format
 
 def main():
     print("=" * 70)
@@ -140,21 +152,23 @@ def main():
             print("❌ WiFi 인터페이스 없음")
             return
         print(f"✅ WiFi: {interface.interfaceName()}")
+        # PyObjC 셀렉터 조회를 루프 밖에서 한 번만
+        read_rssi = interface.rssiValue
     
     print("\n🎬 추적 시작! (Ctrl+C로 종료)")
     print("-" * 70)
     
     last_pos = 0
     last_room = "7413"
+    write, flush = sys.stdout.write, sys.stdout.flush
     
     try:
         while True:
             elapsed = time.time() - start_time
             
             if USE_WIFI:
-                # WiFi RSSI 읽기
-                rssi = interface.rssiValue()
-                bssid = normalize_mac(interface.bssid() or "")
+                # WiFi RSSI 읽기 (BSSID는 쓰지 않으므로 조회 생략)
+                rssi = read_rssi()
             else:
                 # 수동 입력 모드
                 try:
@@ -191,10 +205,10 @@ def main():
             pos_bar = "█" * int(pos / 52 * 30)
             room_marker = f"🆕 {room}" if room_changed else f"   {room}"
             
-            print(f"\r[{elapsed:5.1f}s] RSSI:{rssi:4d}dBm | 위치:{pos:5.1f}m | {room_marker} | {direction} |{pos_bar}", end="", flush=True)
-            
-            if room_changed:
-                print()  # 호실 바뀌면 줄바꿈
+            # 호실 바뀌면 줄바꿈까지 한 번에 쓰기
+            write(_STATUS_FMT(t=elapsed, r=rssi, p=pos, m=room_marker, d=direction, b=pos_bar,
+                              nl="\n" if room_changed else ""))
+            flush()
             
             last_pos = pos
             last_room = room
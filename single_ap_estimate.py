@@ -4,6 +4,8 @@
 복도가 직선이라는 가정하에 RSSI → 거리 → 위치 추정
 """
 
+import numpy as np
+
 from config import ARUBA_APS, get_nearest_room, rssi_to_distance
 
 # AP-7413 정보 (7413 앞에 위치)
@@ -24,6 +26,10 @@ CALIBRATION_DATA = [
     ("7429", -68, 60.8),  # 7429 (위쪽 복도지만 참고용)
 ]
 
+# np.interp용 보간 테이블 (RSSI 오름차순)
+_CAL_RSSI = np.array([d[1] for d in reversed(CALIBRATION_DATA)], dtype=np.float64)
+_CAL_X = np.array([d[2] for d in reversed(CALIBRATION_DATA)], dtype=np.float64)
+
 def estimate_position_single_ap(rssi, ap_x=AP_POSITION[0]):
     """
     단일 AP RSSI로 위치 추정 (복도 직선 가정)
@@ -40,24 +46,12 @@ def estimate_position_single_ap(rssi, ap_x=AP_POSITION[0]):
     
     # 방법 2: 실측 데이터 기반 선형 보간
     # RSSI → X 좌표 직접 매핑
-    rssi_values = [d[1] for d in CALIBRATION_DATA]
-    x_values = [d[2] for d in CALIBRATION_DATA]
-    
-    # 선형 보간
-    if rssi >= rssi_values[0]:
-        # AP보다 가까움
-        estimated_x = x_values[0]
-    elif rssi <= rssi_values[-1]:
+    if rssi <= _CAL_RSSI[0]:
         # 가장 먼 지점보다 멀리
-        estimated_x = x_values[-1] + (rssi_values[-1] - rssi) * 0.5
+        estimated_x = float(_CAL_X[0] + (_CAL_RSSI[0] - rssi) * 0.5)
     else:
-        # 보간
-        for i in range(len(rssi_values) - 1):
-            if rssi_values[i] >= rssi >= rssi_values[i+1]:
-                # 선형 보간
-                ratio = (rssi_values[i] - rssi) / (rssi_values[i] - rssi_values[i+1])
-                estimated_x = x_values[i] + ratio * (x_values[i+1] - x_values[i])
-                break
+        # 보간 (AP보다 가까우면 AP 위치로 고정)
+        estimated_x = float(np.interp(rssi, _CAL_RSSI, _CAL_X))
     
     # Y는 복도 고정값
     estimated_y = CORRIDOR_Y
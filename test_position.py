@@ -3,10 +3,15 @@
 특정 위치에서 위치 추정 테스트 (시뮬레이션)
 """
 
-from config import ARUBA_APS, ROOM_CENTROIDS, rssi_to_distance, get_nearest_room
+from config import AP_POSITIONS_ARR, AP_INDEX, ROOM_CENTROIDS, rssi_to_distance, get_nearest_room
 from ble_scanner import SimulatedScanner
 from position_estimator import PositionEstimator
 import math
+import numpy as np
+
+# 출력 순서대로 AP 이름/좌표 (테스트 위치마다 다시 만들지 않음)
+_AP_NAMES = ("AP-12", "AP-11", "AP-XX", "AP-09", "AP-07", "AP-13")
+_AP_POS = AP_POSITIONS_ARR[[AP_INDEX[name] for name in _AP_NAMES]].astype(np.float64)
 
 def test_at_position(x, y, room_name=""):
     """특정 위치에서 시뮬레이션 테스트"""
@@ -24,10 +29,11 @@ def test_at_position(x, y, room_name=""):
     print("\n📶 예상 RSSI 값 (거리 기반 시뮬레이션):")
     print("-"*60)
     
-    for ap_name in ["AP-12", "AP-11", "AP-XX", "AP-09", "AP-07", "AP-13"]:
+    # 모든 AP까지 거리 한 번에 계산
+    dists = np.linalg.norm(_AP_POS - np.array([x, y], dtype=np.float64), axis=1)
+    
+    for ap_name, distance in zip(_AP_NAMES, dists.tolist()):
         rssi = rssi_result[ap_name]
-        ap_pos = ARUBA_APS[ap_name]["position"]
-        distance = math.sqrt((x - ap_pos[0])**2 + (y - ap_pos[1])**2)
         
         # RSSI 바 그래프
         bar_len = max(0, int((rssi + 100) / 3))
@@ -4,30 +4,65 @@
 7413 = 원점 (0, 0)
 """
 
-from flask import Flask, render_template, jsonify, request, send_file
+from flask import Flask, Response, render_template, jsonify, request, send_file
+from flask.json.provider import JSONProvider
+from collections import deque
+from functools import lru_cache
+import math
+import queue
+import threading
 import time
-import json
 import os
+import weakref
 from datetime import datetime
 
+import numpy as np
+import orjson
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba 미설치 시 순수 Python으로 실행
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
 # Fingerprinting 엔진 임포트
 try:
     from fingerprint_engine import (
         scan_rssi_pattern, 
+        scan_rssi_pairs,
+        ordered_signature,
         collect_fingerprint,
         estimate_location_knn,
-        fingerprint_db,
+        estimate_location_vec,
+        get_db,
         add_fingerprint,
         load_db,
         save_db,
-        get_db_stats
+        get_db_stats,
+        warmup as warmup_fingerprint
     )
     FINGERPRINT_AVAILABLE = True
 except ImportError:
     FINGERPRINT_AVAILABLE = False
     print("⚠️ Fingerprint 엔진 로드 실패")
 
+class ORJSONProvider(JSONProvider):
+    """orjson 기반 JSON 직렬화 (jsonify 가속)"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # ============================================================
 # WiFi 설정
@@ -82,55 +117,191 @@ ROOM_POSITIONS = {
 }
 
 # 전역 데이터
-tracking_data = {
-    "active": False,
-    "start_time": None,
-    "trajectory": [],
-    "current": None
-}
-
-# RSSI 평활화용 버퍼 (최근 N개 평균)
-rssi_buffer = []
-RSSI_BUFFER_SIZE = 10  # 더 많이 평균
-
-# 위치 평활화용 버퍼
-position_buffer = []
-POSITION_BUFFER_SIZE = 8  # 더 많이 평균
+MAX_TRAJECTORY = 20000  # 궤적 최대 포인트 수 (초과 시 오래된 점부터 제거)
+
+class TrackingState:
+    """추적 상태 (__slots__ 속성 접근, 매 요청 dict 키 조회 대신)"""
+    __slots__ = ("active", "start_time", "trajectory", "current",
+                 "min_pos", "max_pos", "rooms_visited")
+    
+    def __init__(self):
+        self.active = False
+        self.start_time = None
+        self.current = None
+        self.reset_trajectory()
+    
+    def reset_trajectory(self):
+        """궤적과 누적 통계 초기화 (통계는 build_status에서 누적 갱신)"""
+        self.trajectory = deque(maxlen=MAX_TRAJECTORY)
+        self.min_pos = None
+        self.max_pos = None
+        self.rooms_visited = {}  # 방문 순서 유지용 dict
+
+tracking_data = TrackingState()
+
+# RSSI/위치 평활화 (지수 이동 평균, NaN이면 첫 값으로 초기화)
+rssi_ema = float("nan")
+RSSI_ALPHA = 0.2   # 작을수록 더 많이 평균
+pos_ema = float("nan")
+POS_ALPHA = 0.25
 
 # 이전 위치 (방향 감지용)
-last_stable_position = 0
+last_stable_position = 0.0
 DIRECTION_THRESHOLD = 5.0  # 5m 이상 이동해야 방향 변경
 
 # 위치 안정화 (작은 변화 무시)
 MIN_POSITION_CHANGE = 1.0  # 1m 미만 변화는 무시
-last_reported_position = 0
-
-def rssi_to_position(rssi):
-    """RSSI → 위치 (미터)"""
-    rssi_list = [c[1] for c in CALIBRATION]
-    pos_list = [c[2] for c in CALIBRATION]
+last_reported_position = 0.0
+
+# 보간 테이블 (RSSI 오름차순) + 구간별 기울기 (_compute_state용)
+# 같은 RSSI가 연속인 폭 0 구간은 searchsorted(side='right')로 선택되지 않으므로 기울기 0으로 둠
+_CAL_RSSI_ARR = np.array([c[1] for c in reversed(CALIBRATION)], dtype=np.float64)
+_CAL_POS_ARR = np.array([c[2] for c in reversed(CALIBRATION)], dtype=np.float64)
+_CAL_SLOPES_ARR = np.divide(np.diff(_CAL_POS_ARR), np.diff(_CAL_RSSI_ARR),
+                            out=np.zeros(len(CALIBRATION) - 1),
+                            where=np.diff(_CAL_RSSI_ARR) != 0)
+
+# 위치 오름차순 호실 목록 (같은 거리면 앞쪽 호실, 기존 dict 순서와 동일)
+_SORTED_ROOMS = sorted(ROOM_POSITIONS.items(), key=lambda kv: kv[1])
+_SORTED_NAMES = tuple(name for name, _ in _SORTED_ROOMS)
+_SORTED_POS_ARR = np.array([p for _, p in _SORTED_ROOMS], dtype=np.float64)
+_DIRECTIONS = ("backward", "stay", "forward")  # _compute_state 방향 코드 + 1
+
+# 스캔 결과 재사용 (짧은 간격으로 폴링하면 CoreWLAN 스캔 생략)
+SCAN_TTL = 0.75  # 초
+_last_scan = {"t": 0.0, "pairs": None}
+
+def cached_scan_pairs(top_n=15):
+    """SCAN_TTL 안이면 직전 (MAC, RSSI) 스캔 결과 재사용"""
+    now = time.monotonic()
+    if _last_scan["pairs"] is not None and now - _last_scan["t"] < SCAN_TTL:
+        return _last_scan["pairs"][:top_n]
+    pairs = scan_rssi_pairs(top_n)
+    _last_scan.update(t=now, pairs=pairs)
+    return pairs
+
+# 백그라운드 스캔 스냅샷 (_scan_worker가 갱신, 요청 핸들러는 읽기만)
+SCAN_INTERVAL = 0.5  # 초
+_scan_lock = threading.Lock()
+_scan_state = {"raw_rssi": -50, "pairs": [], "ts": 0.0}
+
+def _scan_worker():
+    """CoreWLAN 스캔을 주기적으로 실행해 최신 결과를 _scan_state에 게시"""
+    while True:
+        try:
+            pairs = scan_rssi_pairs(15) if FINGERPRINT_AVAILABLE else []
+            raw_rssi = interface.rssiValue() if USE_WIFI and interface else -50
+            with _scan_lock:
+                _scan_state.update(raw_rssi=raw_rssi, pairs=pairs, ts=time.time())
+            publish_status()
+        except Exception as e:
+            print(f"스캔 에러: {e}")
+        time.sleep(SCAN_INTERVAL)
+
+def start_scan_worker():
+    """백그라운드 스캔 스레드 시작"""
+    threading.Thread(target=_scan_worker, daemon=True).start()
+
+def scan_snapshot():
+    """최신 스캔 스냅샷 (스캔 스레드가 아직 게시 전이면 None)"""
+    with _scan_lock:
+        if not _scan_state["ts"]:
+            return None
+        return dict(_scan_state)
+
+# Fingerprint/RSSI 혼합 가중치 w = sigmoid(FP_BLEND_K * (신뢰도 - FP_BLEND_MID))
+FP_BLEND_K = 10.0
+FP_BLEND_MID = 0.6
+FP_SATURATE = 0.95  # w가 이보다 크면 혼합 없이 Fingerprint 위치 그대로
+
+@njit(cache=True)
+def _nearest_idx(room_pos, x):
+    """위치에서 가장 가까운 호실 인덱스 (이진 탐색 후 양옆 두 호실만 비교, 같은 거리면 앞쪽)"""
+    j = np.searchsorted(room_pos, x)
+    if j == 0:
+        return 0
+    if j == room_pos.shape[0]:
+        return j - 1
+    if x - room_pos[j - 1] <= room_pos[j] - x:
+        return j - 1
+    return j
+
+@njit(cache=True)
+def _compute_state(raw_rssi, rssi_ema, pos_ema, last_stable, last_reported,
+                   cal_rssi, cal_pos, slopes, room_pos, fp_pos, w_fp):
+    """
+    get_status 수치 계산 (Numba JIT, 전역 상태는 인자로 받고 새 값을 반환)
+    RSSI 평활화 → 위치 보간 → 위치 평활화/안정화 → Fingerprint 혼합 → 가까운 호실 → 방향
+    rssi_ema/pos_ema가 NaN이면 첫 값으로 초기화
+    fp_pos가 NaN이면 RSSI 위치만, 아니면 w_fp * fp_pos + (1 - w_fp) * RSSI 위치
+    (RSSI 평활화 상태는 Fingerprint 신뢰도와 무관하게 항상 갱신)
+    
+    Returns:
+        (rssi_ema, pos_ema, rssi_pos, rssi_room_idx, final_pos, final_room_idx, last_stable, direction)
+        *_room_idx: room_pos 인덱스, direction: -1 backward / 0 stay / 1 forward
+    """
+    rssi_ema = raw_rssi if np.isnan(rssi_ema) else rssi_ema + RSSI_ALPHA * (raw_rssi - rssi_ema)
+    
+    # RSSI → 위치 (보간, 범위 밖은 끝 값 / 1m/dB 외삽)
+    if rssi_ema >= cal_rssi[-1]:
+        raw_pos = cal_pos[-1]
+    elif rssi_ema <= cal_rssi[0]:
+        raw_pos = cal_pos[0] + (cal_rssi[0] - rssi_ema) * 1.0
+    else:
+        i = np.searchsorted(cal_rssi, rssi_ema, side='right') - 1
+        raw_pos = cal_pos[i] + (rssi_ema - cal_rssi[i]) * slopes[i]
+    
+    pos_ema = raw_pos if np.isnan(pos_ema) else pos_ema + POS_ALPHA * (raw_pos - pos_ema)
+    if abs(pos_ema - last_reported) >= MIN_POSITION_CHANGE:
+        last_reported = pos_ema
+    rssi_pos = last_reported
+    rssi_room_idx = _nearest_idx(room_pos, rssi_pos)
     
-    if rssi >= rssi_list[0]:
-        return pos_list[0]
-    elif rssi <= rssi_list[-1]:
-        return pos_list[-1] + (rssi_list[-1] - rssi) * 1.0
+    # Fingerprint 혼합 (포화 시 Fingerprint 위치 그대로)
+    if np.isnan(fp_pos):
+        final_pos = rssi_pos
+        final_room_idx = rssi_room_idx
     else:
-        for i in range(len(rssi_list) - 1):
-            if rssi_list[i] >= rssi >= rssi_list[i+1]:
-                ratio = (rssi_list[i] - rssi) / (rssi_list[i] - rssi_list[i+1])
-                return pos_list[i] + ratio * (pos_list[i+1] - pos_list[i])
-    return 0
-
-def get_nearest_room(pos):
-    """위치에서 가장 가까운 호실"""
-    min_dist = float('inf')
-    nearest = "7413"
-    for room, room_pos in ROOM_POSITIONS.items():
-        dist = abs(pos - room_pos)
-        if dist < min_dist:
-            min_dist = dist
-            nearest = room
-    return nearest
+        if w_fp > FP_SATURATE:
+            final_pos = fp_pos
+        else:
+            final_pos = w_fp * fp_pos + (1.0 - w_fp) * rssi_pos
+        final_room_idx = _nearest_idx(room_pos, final_pos)
+    
+    # 방향 감지
+    direction = 0
+    diff = final_pos - last_stable
+    if abs(diff) >= DIRECTION_THRESHOLD:
+        direction = 1 if diff > 0 else -1
+        last_stable = final_pos
+    
+    return (rssi_ema, pos_ema, rssi_pos, rssi_room_idx, final_pos, final_room_idx,
+            last_stable, direction)
+
+@lru_cache(maxsize=512)
+def _resolve_location(fp_location, fp_confidence):
+    """
+    Fingerprint 결과 → (_compute_state에 넘길 fp_pos, 위치 혼합 가중치, method)
+    신뢰도는 몇 단계 값뿐이라 정지 상태 폴링은 캐시 적중
+    method: 신뢰도 가중치가 0.5 이상(위치의 절반 이상이 Fingerprint)이면 "fingerprint"
+    ROOM_POSITIONS에 없는 위치(사용자 수집 라벨 등)는 위치 혼합 없이 호실 이름만 사용
+    """
+    if not fp_location:
+        return np.nan, 0.0, "rssi"
+    w_fp = 1.0 / (1.0 + math.exp(-FP_BLEND_K * (fp_confidence - FP_BLEND_MID)))
+    method = "fingerprint" if w_fp >= 0.5 else "rssi"
+    fp_pos = ROOM_POSITIONS.get(fp_location)
+    if fp_pos is None:
+        return np.nan, 0.0, method
+    return fp_pos, w_fp, method
+
+def warmup():
+    """JIT 커널 미리 컴파일 (첫 요청 지연 방지)"""
+    for fp_pos in (np.nan, 0.0):
+        _compute_state(-50.0, np.nan, np.nan, 0.0, 0.0, _CAL_RSSI_ARR, _CAL_POS_ARR,
+                       _CAL_SLOPES_ARR, _SORTED_POS_ARR, fp_pos, 0.5)
+    if FINGERPRINT_AVAILABLE:
+        warmup_fingerprint()  # KNN 커널 (_knn_kernel)
 
 # ============================================================
 # API 엔드포인트
@@ -169,8 +340,8 @@ def save_calibration():
         "data": data.get('data', [])
     }
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    with open(filename, 'wb') as f:
+        f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     
     return jsonify({"status": "saved", "filename": filename})
 
@@ -228,14 +399,16 @@ def fingerprint_estimate():
     if not FINGERPRINT_AVAILABLE:
         return jsonify({"error": "Fingerprint 엔진 없음"}), 500
     
-    # 현재 패턴 스캔
-    current_pattern = scan_rssi_pattern(15)
+    # 현재 패턴 스캔 (직전 스캔 재사용 가능)
+    pairs = cached_scan_pairs(15)
+    current_pattern = [rssi for _, rssi in pairs]
+    signature = ordered_signature([mac for mac, _ in pairs])
     
     if not current_pattern:
         return jsonify({"error": "스캔 실패"}), 500
     
     # 위치 추정
-    location, confidence, top_k = estimate_location_knn(current_pattern, k=3)
+    location, confidence, top_k = estimate_location_knn(current_pattern, k=3, signature=signature)
     
     return jsonify({
         "estimated_location": location,
@@ -269,6 +442,7 @@ def fingerprint_save():
     data = request.json
     
     # DB에 추가
+    fingerprint_db = get_db()
     for location, fp_data in data.items():
         fingerprint_db[location] = {
             "location": location,
@@ -288,23 +462,20 @@ def fingerprint_save():
         "count": len(fingerprint_db)
     })
 
-@app.route('/api/status')
-def get_status():
-    """현재 상태 반환 (Fingerprinting 통합)"""
-    global rssi_buffer, position_buffer, last_stable_position, last_reported_position
+def build_status():
+    """현재 상태 계산 (Fingerprinting 통합), /api/status와 스트림이 공유"""
+    global rssi_ema, pos_ema, last_stable_position, last_reported_position
+    
+    # 스캔 스레드의 최신 결과 사용 (스레드가 없으면 직접 읽기)
+    snapshot = scan_snapshot()
     
     raw_rssi = -50  # 기본값
     
-    if USE_WIFI and interface:
+    if snapshot:
+        raw_rssi = snapshot["raw_rssi"]
+    elif USE_WIFI and interface:
         raw_rssi = interface.rssiValue()
     
-    # RSSI 평활화 (이동 평균)
-    rssi_buffer.append(raw_rssi)
-    if len(rssi_buffer) > RSSI_BUFFER_SIZE:
-        rssi_buffer.pop(0)
-    
-    smoothed_rssi = sum(rssi_buffer) / len(rssi_buffer)
-    
     # ============================================================
     # Fingerprinting 기반 위치 추정 (우선)
     # ============================================================
@@ -312,11 +483,17 @@ def get_status():
     fp_confidence = 0
     fp_candidates = []
     
-    if FINGERPRINT_AVAILABLE and len(fingerprint_db) >= 3:
+    fp_available = FINGERPRINT_AVAILABLE and len(get_db()) >= 3
+    if fp_available:
         try:
-            current_pattern = scan_rssi_pattern(15)
-            if current_pattern:
-                fp_location, fp_confidence, top_k = estimate_location_knn(current_pattern, k=3)
+            pairs = snapshot["pairs"] if snapshot else cached_scan_pairs(15)
+            if pairs:
+                # AP별 평균 RSSI 행렬 KNN 우선, ap_rssi 없는 위치가 하나라도 있으면 순위 패턴 KNN
+                fp_location, fp_confidence, top_k = estimate_location_vec(pairs, k=3)
+                if fp_location is None:
+                    current_pattern = [rssi for _, rssi in pairs]
+                    signature = ordered_signature([mac for mac, _ in pairs])
+                    fp_location, fp_confidence, top_k = estimate_location_knn(current_pattern, k=3, signature=signature)
                 fp_candidates = [
                     {"location": item["location"], "distance": round(item["distance"], 2)}
                     for item in top_k
@@ -325,110 +502,159 @@ def get_status():
             pass
     
     # ============================================================
-    # 기존 RSSI 기반 위치 (fallback)
-    # ============================================================
-    raw_pos = rssi_to_position(smoothed_rssi)
-    
-    position_buffer.append(raw_pos)
-    if len(position_buffer) > POSITION_BUFFER_SIZE:
-        position_buffer.pop(0)
-    
-    smoothed_pos = sum(position_buffer) / len(position_buffer)
-    
-    if abs(smoothed_pos - last_reported_position) < MIN_POSITION_CHANGE:
-        rssi_pos = last_reported_position
-    else:
-        rssi_pos = smoothed_pos
-        last_reported_position = smoothed_pos
-    
-    rssi_room = get_nearest_room(rssi_pos)
-    
-    # ============================================================
-    # 최종 위치 결정 (Fingerprint 우선, 높은 신뢰도만)
+    # RSSI 기반 위치 + 최종 위치 결정 (Fingerprint 신뢰도 가중 혼합)
     # ============================================================
-    # 신뢰도 0.75 이상일 때만 Fingerprint 사용, 그 외는 RSSI fallback
-    if fp_location and fp_confidence >= 0.75:
-        final_room = fp_location
-        final_pos = ROOM_POSITIONS.get(fp_location, rssi_pos)
-        method = "fingerprint"
+    # 신뢰도 시그모이드 가중치로 Fingerprint 위치와 RSSI 위치를 혼합 (경계에서 모드 전환 없음)
+    # w_fp: 위치 혼합 가중치 (좌표 없는 위치면 0)
+    fp_pos, w_fp, method = _resolve_location(fp_location, float(fp_confidence))
+    
+    (rssi_ema, pos_ema, rssi_pos, rssi_idx, final_pos, final_idx,
+     last_stable_position, dir_code) = _compute_state(
+        float(raw_rssi), rssi_ema, pos_ema, last_stable_position, last_reported_position,
+        _CAL_RSSI_ARR, _CAL_POS_ARR, _CAL_SLOPES_ARR, _SORTED_POS_ARR, fp_pos, w_fp)
+    last_reported_position = rssi_pos
+    smoothed_rssi = rssi_ema
+    rssi_room = _SORTED_NAMES[rssi_idx]
+    if method == "fingerprint" and np.isnan(fp_pos):
+        final_room = fp_location  # 위치 좌표 없는 Fingerprint 라벨 (위치는 RSSI)
     else:
-        final_room = rssi_room
-        final_pos = rssi_pos
-        method = "rssi"
+        final_room = _SORTED_NAMES[final_idx]
+    direction = _DIRECTIONS[dir_code + 1]
     
-    # 방향 감지
-    diff = final_pos - last_stable_position
-    if abs(diff) >= DIRECTION_THRESHOLD:
-        direction = "forward" if diff > 0 else "backward"
-        last_stable_position = final_pos
-    else:
-        direction = "stay"
+    # 궤적 점과 응답이 같이 쓰는 반올림 값은 한 번만 계산
+    rssi_r = round(smoothed_rssi)
+    pos_r = round(final_pos, 1)
     
     # 추적 중이면 궤적에 추가
-    if tracking_data["active"]:
-        elapsed = time.time() - tracking_data["start_time"]
+    td = tracking_data
+    if td.active:
         point = {
-            "time": round(elapsed, 1),
-            "rssi": round(smoothed_rssi),
-            "position": round(final_pos, 1),
+            "time": round(time.time() - td.start_time, 1),
+            "rssi": rssi_r,
+            "position": pos_r,
             "room": final_room,
             "method": method,
             "confidence": round(fp_confidence, 2) if method == "fingerprint" else None
         }
-        tracking_data["trajectory"].append(point)
-        tracking_data["current"] = point
-    
-    return jsonify({
+        td.trajectory.append(point)
+        td.current = point
+        
+        # 통계 누적 (저장 시 재계산하지 않음)
+        if td.min_pos is None or pos_r < td.min_pos:
+            td.min_pos = pos_r
+        if td.max_pos is None or pos_r > td.max_pos:
+            td.max_pos = pos_r
+        td.rooms_visited.setdefault(final_room, None)
+    
+    return {
         "wifi_available": USE_WIFI,
-        "rssi": round(smoothed_rssi),
+        "rssi": rssi_r,
         "raw_rssi": raw_rssi,
-        "position": round(final_pos, 1),
+        "position": pos_r,
         "room": final_room,
         "direction": direction,
         "method": method,
         "fingerprint": {
-            "available": FINGERPRINT_AVAILABLE and len(fingerprint_db) >= 3,
+            "available": fp_available,
             "location": fp_location,
             "confidence": round(fp_confidence, 2),
+            "weight": round(w_fp, 2),  # 최종 위치에 섞인 Fingerprint 위치 비율
             "candidates": fp_candidates
         },
         "rssi_fallback": {
             "position": round(rssi_pos, 1),
             "room": rssi_room
         },
-        "tracking": tracking_data["active"],
-        "trajectory_count": len(tracking_data["trajectory"])
-    })
+        "tracking": td.active,
+        "trajectory_count": len(td.trajectory)
+    }
+
+# 평활화/궤적 상태는 프로세스 전역 → 폴링과 스캔 스레드가 동시에 갱신하지 않도록
+_status_lock = threading.Lock()
+
+# SSE 구독자 큐 (연결이 끊기면 자동 제거)
+_subscribers = weakref.WeakSet()
+_subscribers_lock = threading.Lock()
+STREAM_QUEUE_SIZE = 10   # 느린 클라이언트는 이 이상 쌓이면 건너뜀
+STREAM_KEEPALIVE = 15.0  # 초, 새 상태가 없으면 keepalive 주석 전송 (끊긴 연결 감지)
+
+def publish_status():
+    """
+    새 스캔마다 스캔 스레드에서 한 번 호출: 상태를 한 번만 계산해 SSE 구독자들에게 전달
+    구독자가 없으면 계산 생략 (평활화/궤적은 폴링 요청만 갱신)
+    """
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    if not subscribers:
+        return
+    with _status_lock:
+        status = build_status()
+    data = orjson.dumps(status, option=orjson.OPT_SERIALIZE_NUMPY)
+    for q in subscribers:
+        try:
+            q.put_nowait(data)
+        except queue.Full:
+            pass  # 느린 클라이언트는 건너뜀
+
+@app.route('/api/status')
+def get_status():
+    """현재 상태 반환 (Fingerprinting 통합)"""
+    with _status_lock:
+        status = build_status()
+    return jsonify(status)
+
+@app.route('/api/status/stream')
+def stream_status():
+    """상태 업데이트 스트림 (Server-Sent Events, 새 스캔마다 publish_status가 전송)"""
+    def generate():
+        q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        with _subscribers_lock:
+            _subscribers.add(q)
+        try:
+            while True:
+                try:
+                    data = q.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    # 끊긴 클라이언트는 여기서 쓰기 실패 → 제너레이터 종료, 스레드 반환
+                    yield b": keepalive\n\n"
+                    continue
+                yield b"data: " + data + b"\n\n"
+        finally:
+            with _subscribers_lock:
+                _subscribers.discard(q)
+    
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
 
 @app.route('/api/start')
 def start_tracking():
     """추적 시작"""
-    tracking_data["active"] = True
-    tracking_data["start_time"] = time.time()
-    tracking_data["trajectory"] = []
+    tracking_data.active = True
+    tracking_data.start_time = time.time()
+    tracking_data.reset_trajectory()
     return jsonify({"status": "started"})
 
 @app.route('/api/stop')
 def stop_tracking():
     """추적 중지"""
-    tracking_data["active"] = False
+    tracking_data.active = False
     return jsonify({
         "status": "stopped",
-        "trajectory": tracking_data["trajectory"]
+        "trajectory": list(tracking_data.trajectory)
     })
 
 @app.route('/api/trajectory')
 def get_trajectory():
     """궤적 데이터 반환"""
     return jsonify({
-        "trajectory": tracking_data["trajectory"],
+        "trajectory": list(tracking_data.trajectory),
         "rooms": ROOM_POSITIONS
     })
 
 @app.route('/api/clear')
 def clear_trajectory():
     """궤적 초기화"""
-    tracking_data["trajectory"] = []
+    tracking_data.reset_trajectory()
     return jsonify({"status": "cleared"})
 
 @app.route('/api/save', methods=['POST'])
@@ -440,15 +666,15 @@ def save_trajectory():
     filename = f"logs/track_{timestamp}.json"
     
     # 통계 계산
-    traj = tracking_data["trajectory"]
+    traj = list(tracking_data.trajectory)
     if traj:
-        positions = [p['position'] for p in traj]
-        rooms_visited = list(dict.fromkeys([p['room'] for p in traj]))
+        min_pos = tracking_data.min_pos
+        max_pos = tracking_data.max_pos
         stats = {
-            "min_position": min(positions),
-            "max_position": max(positions),
-            "total_distance": max(positions) - min(positions),
-            "rooms_visited": rooms_visited,
+            "min_position": min_pos,
+            "max_position": max_pos,
+            "total_distance": max_pos - min_pos,
+            "rooms_visited": list(tracking_data.rooms_visited),
             "point_count": len(traj)
         }
     else:
@@ -462,8 +688,8 @@ def save_trajectory():
         "trajectory": traj
     }
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(filename, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     
     return jsonify({
         "status": "saved",
@@ -471,22 +697,33 @@ def save_trajectory():
         "stats": stats
     })
 
+# /api/list 결과 캐시 (logs 디렉터리 mtime이 바뀔 때만 재구성)
+_list_cache = {"mtime": None, "data": None}
+
 @app.route('/api/list')
 def list_saved():
     """저장된 파일 목록"""
     os.makedirs("logs", exist_ok=True)
+    mtime = os.stat("logs").st_mtime_ns
+    if _list_cache["data"] is not None and mtime == _list_cache["mtime"]:
+        return jsonify(_list_cache["data"])
+    
     files = []
-    for f in os.listdir("logs"):
-        if f.startswith("track_") and f.endswith(".json"):
-            path = os.path.join("logs", f)
-            files.append({
-                "filename": f,
-                "path": path,
-                "size": os.path.getsize(path),
-                "modified": datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
-            })
+    with os.scandir("logs") as it:
+        for entry in it:
+            f = entry.name
+            if f.startswith("track_") and f.endswith(".json"):
+                st = entry.stat()
+                files.append({
+                    "filename": f,
+                    "path": os.path.join("logs", f),
+                    "size": st.st_size,
+                    "modified": datetime.fromtimestamp(st.st_mtime).isoformat()
+                })
     files.sort(key=lambda x: x['modified'], reverse=True)
-    return jsonify({"files": files})
+    data = {"files": files}
+    _list_cache.update(mtime=mtime, data=data)
+    return jsonify(data)
 
 @app.route('/api/load/<filename>')
 def load_trajectory(filename):
@@ -495,8 +732,8 @@ def load_trajectory(filename):
     if not os.path.exists(path):
         return jsonify({"error": "파일 없음"}), 404
     
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    with open(path, 'rb') as f:
+        data = orjson.loads(f.read())
     
     return jsonify(data)
 
@@ -508,11 +745,34 @@ def download_trajectory(filename):
         return jsonify({"error": "파일 없음"}), 404
     return send_file(path, as_attachment=True)
 
+_started = threading.Event()
+_start_lock = threading.Lock()
+
+def create_app():
+    """
+    JIT 워밍업 + 백그라운드 스캔 시작 후 앱 반환 (프로세스당 한 번만 실행)
+    gunicorn 진입점: gunicorn -c gunicorn_web_track.py
+    """
+    with _start_lock:
+        if not _started.is_set():
+            warmup()
+            start_scan_worker()
+            _started.set()
+    return app
+
+@app.before_request
+def _ensure_started():
+    """flask run 등 create_app()을 거치지 않은 경우 첫 요청에서 시작"""
+    if not _started.is_set():
+        create_app()
+
 if __name__ == '__main__':
     print("=" * 60)
     print("🌐 웹 기반 실시간 위치 추적")
     print("=" * 60)
     print(f"WiFi 사용: {'✅ 가능' if USE_WIFI else '❌ 불가'}")
     print("\n🔗 http://localhost:5001 에서 확인하세요!")
+    print("   운영 환경: gunicorn -c gunicorn_web_track.py")
     print("=" * 60)
+    create_app()
     app.run(debug=False, host='0.0.0.0', port=5001, threaded=True)
@@ -6,14 +6,8 @@
 from CoreWLAN import CWWiFiClient
 import subprocess
 
-def normalize_mac(mac: str) -> str:
-    if not mac:
-        return ""
-    mac = mac.upper().replace("-", ":").replace(".", ":")
-    mac_clean = mac.replace(":", "")
-    if len(mac_clean) == 12:
-        return ":".join(mac_clean[i:i+2] for i in range(0, 12, 2))
-    return mac
+from wifi_scanner import normalize_mac
+
 
 # 등록된 Aruba AP
 ARUBA_WIFI_MACS = {
@@ -5,15 +5,7 @@
 
 from CoreWLAN import CWWiFiClient
 
-def normalize_mac(mac: str) -> str:
-    """MAC 주소 정규화"""
-    if not mac:
-        return ""
-    mac = mac.upper().replace("-", ":").replace(".", ":")
-    mac_clean = mac.replace(":", "")
-    if len(mac_clean) == 12:
-        return ":".join(mac_clean[i:i+2] for i in range(0, 12, 2))
-    return mac
+from wifi_scanner import normalize_mac
 
 print("=" * 80)
 print("📡 전체 WiFi AP 스캔")
@@ -48,13 +40,15 @@ for network in networks:
     ch = network.wlanChannel().channelNumber() if network.wlanChannel() else 0
     all_networks.append((ssid, bssid, rssi, ch))
 
-# RSSI 순으로 정렬
+# RSSI 순으로 한 번만 정렬 (아래 목록들은 이 순서를 그대로 유지)
+all_networks.sort(key=lambda x: x[2], reverse=True)
+
 print("📶 RSSI 순 (상위 30개):")
 print("-" * 80)
 print(f"{'RSSI':>6} | {'BSSID':17} | {'CH':>3} | {'SSID'}")
 print("-" * 80)
 
-for ssid, bssid, rssi, ch in sorted(all_networks, key=lambda x: x[2], reverse=True)[:30]:
+for ssid, bssid, rssi, ch in all_networks[:30]:
     bar = "█" * max(0, (rssi + 100) // 4)
     # Aruba OUI 체크
     marker = "🔸" if bssid.startswith("24:F2:7F") else "  "
@@ -66,7 +60,7 @@ print("🔍 24:F2:7F (Aruba OUI)로 시작하는 AP:")
 print("-" * 80)
 aruba_aps = [(s, b, r, c) for s, b, r, c in all_networks if b.startswith("24:F2:7F")]
 if aruba_aps:
-    for ssid, bssid, rssi, ch in sorted(aruba_aps, key=lambda x: x[2], reverse=True):
+    for ssid, bssid, rssi, ch in aruba_aps:
         print(f"  {rssi:4d} dBm | {bssid} | ch.{ch:3} | {ssid}")
 else:
     print("  (없음)")
@@ -76,7 +70,7 @@ print("\n🔍 'hallym' 포함 SSID:")
 print("-" * 80)
 hallym_aps = [(s, b, r, c) for s, b, r, c in all_networks if "hallym" in s.lower()]
 if hallym_aps:
-    for ssid, bssid, rssi, ch in sorted(hallym_aps, key=lambda x: x[2], reverse=True):
+    for ssid, bssid, rssi, ch in hallym_aps:
         print(f"  {rssi:4d} dBm | {bssid} | ch.{ch:3} | {ssid}")
 else:
     print("  (없음)")
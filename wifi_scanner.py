@@ -4,10 +4,13 @@ WiFi RSSI 기반 스캐너
 macOS CoreWLAN 프레임워크를 사용하여 WiFi AP 스캔
 """
 
+import logging
 import subprocess
 from typing import Dict, List, Tuple
 from config import ARUBA_APS, AP_POSITIONS, RSSI_MIN
 
+log = logging.getLogger(__name__)
+
 # Aruba AP의 Ethernet MAC 주소 (WiFi BSSID)
 ARUBA_WIFI_MACS = {
     "24:F2:7F:C7:F5:6A": "AP-12",  # 7415 근처
@@ -18,13 +21,19 @@ ARUBA_WIFI_MACS = {
     "24:F2:7F:C7:F8:AA": "AP-13",  # 인문2관
     "24:F2:7F:FF:56:B2": "AP-7413",  # 7413 앞 (실측 발견!)
 }
+_ARUBA_OUI = "24:F2:7F"  # Aruba OUI (정규화된 BSSID 앞 8글자)
+
+# 구분자 '-', '.' → ':' (translate 한 번)
+_MAC_SEP = str.maketrans("-.", "::")
 
 def normalize_mac(mac: str) -> str:
     """MAC 주소 정규화 (대문자, 콜론 구분)"""
-    mac = mac.upper().replace("-", ":").replace(".", ":")
-    mac_clean = mac.replace(":", "")
-    if len(mac_clean) == 12:
-        return ":".join(mac_clean[i:i+2] for i in range(0, 12, 2))
+    if not mac:
+        return ""
+    mac = mac.upper().translate(_MAC_SEP)
+    c = mac.replace(":", "")
+    if len(c) == 12:
+        return f"{c[0:2]}:{c[2:4]}:{c[4:6]}:{c[6:8]}:{c[8:10]}:{c[10:12]}"
     return mac
 
 
@@ -63,7 +72,7 @@ class WiFiScanner:
         result = {}
         
         if not self.interface:
-            print("❌ WiFi 인터페이스가 없습니다")
+            log.error("❌ WiFi 인터페이스가 없습니다")
             return result
         
         try:
@@ -71,59 +80,41 @@ class WiFiScanner:
             networks, error = self.interface.scanForNetworksWithName_error_(None, None)
             
             if error:
-                print(f"❌ 스캔 오류: {error}")
+                log.error("❌ 스캔 오류: %s", error)
                 return result
             
-            print("\n📡 WiFi 스캔 결과:")
-            print("-" * 80)
-            
+            # 진단용 목록은 DEBUG 로그가 켜져 있을 때만 수집
+            debug = log.isEnabledFor(logging.DEBUG)
             found_aps = []
             hallym_aps = []
             aruba_unknown = []
             
             for network in networks:
+                # ObjC 메시지는 네트워크당 한 번씩만 호출
                 ssid = network.ssid() or "(숨겨진 SSID)"
                 bssid = normalize_mac(network.bssid() or "")
                 rssi = network.rssiValue()
-                channel = network.wlanChannel().channelNumber() if network.wlanChannel() else 0
                 
                 # Aruba AP 확인 (등록된 MAC)
-                if bssid in ARUBA_WIFI_MACS:
-                    ap_name = ARUBA_WIFI_MACS[bssid]
+                ap_name = ARUBA_WIFI_MACS.get(bssid)
+                if ap_name is not None:
                     result[ap_name] = rssi
+                if not debug:
+                    continue
+                
+                ch_obj = network.wlanChannel()
+                channel = ch_obj.channelNumber() if ch_obj else 0
+                if ap_name is not None:
                     found_aps.append((ap_name, ssid, bssid, rssi, channel))
                 # Aruba OUI (24:F2:7F)로 시작하는 MAC
-                elif bssid.startswith("24:F2:7F"):
+                elif bssid[:8] == _ARUBA_OUI:
                     aruba_unknown.append((ssid, bssid, rssi, channel))
                 # hallym SSID
                 if "hallym" in ssid.lower():
                     hallym_aps.append((ssid, bssid, rssi, channel))
             
-            # 발견된 Aruba AP 출력
-            if found_aps:
-                print("\n✅ 발견된 등록 Aruba AP:")
-                for ap_name, ssid, bssid, rssi, ch in sorted(found_aps, key=lambda x: x[3], reverse=True):
-                    bar = "█" * max(0, (rssi + 100) // 3)
-                    pos = AP_POSITIONS.get(ap_name, (0, 0))
-                    print(f"  📶 {ap_name:6} | {rssi:4d} dBm | {bssid} | {ssid[:15]:15} | 위치:({pos[0]:.0f},{pos[1]:.0f}) | {bar}")
-            else:
-                print("\n❌ 등록된 Aruba AP를 찾지 못했습니다")
-            
-            # 미등록 Aruba AP
-            if aruba_unknown:
-                print("\n🔸 미등록 Aruba AP (24:F2:7F...):")
-                for ssid, bssid, rssi, ch in sorted(aruba_unknown, key=lambda x: x[2], reverse=True):
-                    bar = "█" * max(0, (rssi + 100) // 3)
-                    print(f"  {rssi:4d} dBm | {bssid} | {ssid[:20]:20} | ch.{ch:3} | {bar}")
-            
-            # hallym AP들
-            if hallym_aps:
-                print(f"\n📋 'hallym' SSID ({len(hallym_aps)}개):")
-                for ssid, bssid, rssi, ch in sorted(hallym_aps, key=lambda x: x[2], reverse=True)[:10]:
-                    bar = "█" * max(0, (rssi + 100) // 3)
-                    # 등록 여부 표시
-                    marker = "✓" if bssid in ARUBA_WIFI_MACS else " "
-                    print(f"  {marker} {rssi:4d} dBm | {bssid} | {ssid[:25]:25} | ch.{ch:3} | {bar}")
+            if debug:
+                _log_scan_report(found_aps, aruba_unknown, hallym_aps)
             
             # 감지되지 않은 AP는 RSSI_MIN으로 설정
             for mac, ap_name in ARUBA_WIFI_MACS.items():
@@ -131,9 +122,7 @@ class WiFiScanner:
                     result[ap_name] = RSSI_MIN
                     
         except Exception as e:
-            print(f"❌ WiFi 스캔 오류: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("❌ WiFi 스캔 오류: %s", e)
         
         self.last_rssi = result
         return result
@@ -147,6 +136,37 @@ class WiFiScanner:
         return result
 
 
+def _log_scan_report(found_aps, aruba_unknown, hallym_aps):
+    """스캔 결과 진단 출력 (DEBUG)"""
+    log.debug("\n📡 WiFi 스캔 결과:\n%s", "-" * 80)
+    
+    # 발견된 Aruba AP 출력
+    if found_aps:
+        log.debug("\n✅ 발견된 등록 Aruba AP:")
+        for ap_name, ssid, bssid, rssi, ch in sorted(found_aps, key=lambda x: x[3], reverse=True):
+            bar = "█" * max(0, (rssi + 100) // 3)
+            pos = AP_POSITIONS.get(ap_name, (0, 0))
+            log.debug(f"  📶 {ap_name:6} | {rssi:4d} dBm | {bssid} | {ssid[:15]:15} | 위치:({pos[0]:.0f},{pos[1]:.0f}) | {bar}")
+    else:
+        log.debug("\n❌ 등록된 Aruba AP를 찾지 못했습니다")
+    
+    # 미등록 Aruba AP
+    if aruba_unknown:
+        log.debug("\n🔸 미등록 Aruba AP (24:F2:7F...):")
+        for ssid, bssid, rssi, ch in sorted(aruba_unknown, key=lambda x: x[2], reverse=True):
+            bar = "█" * max(0, (rssi + 100) // 3)
+            log.debug(f"  {rssi:4d} dBm | {bssid} | {ssid[:20]:20} | ch.{ch:3} | {bar}")
+    
+    # hallym AP들
+    if hallym_aps:
+        log.debug(f"\n📋 'hallym' SSID ({len(hallym_aps)}개):")
+        for ssid, bssid, rssi, ch in sorted(hallym_aps, key=lambda x: x[2], reverse=True)[:10]:
+            bar = "█" * max(0, (rssi + 100) // 3)
+            # 등록 여부 표시
+            marker = "✓" if bssid in ARUBA_WIFI_MACS else " "
+            log.debug(f"  {marker} {rssi:4d} dBm | {bssid} | {ssid[:25]:25} | ch.{ch:3} | {bar}")
+
+
 def scan_and_estimate():
     """WiFi 스캔 후 위치 추정"""
     from position_estimator import PositionEstimator
@@ -203,4 +223,6 @@ def scan_and_estimate():
 
 
 if __name__ == "__main__":
+    # CLI 실행 시에는 스캔 진단 출력까지 표시
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
     scan_and_estimate()